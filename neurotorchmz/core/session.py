@@ -118,20 +118,26 @@ class SessionAPI:
     def __init__(self, session: Session):
         self.session = session
 
-    def open_file(self, path: Path, run_async:bool = True) -> ImageObject|Task:
+    def open_file(self, path: Path, run_async:bool = True, lazy: bool = False, frames: slice|None = None, crop: tuple[slice, slice]|None = None, 
+                  channel: int|None = None) -> ImageObject|Task:
         """ 
             Opens the given path in Neurotorch
 
             :param pathlib.Path path: The path to the file
             :param bool run_async: Controls if the task runs in a different thread (recommended, as it will not block the window)
+            :param bool lazy: Do not load TIFF and ND2 files into memory but read them on demand (see ImageObject.open_file)
+            :param slice|None frames: Only load the given frames (start, stop and step)
+            :param tuple[slice, slice]|None crop: Only load the given spatial region (y, x)
+            :param int|None channel: For colored images, use the given color channel instead of converting the image to grey scale
             :returns ImageObject|Task: The ImageObject (run_async=False) or a task object. If a task is returned, use task.add_callback(function=function) to get notified once the image is loaded
             :raises AlreadyLoading: There is already a task working on this ImageObject
             :raises FileNotFoundError: Can't find the file
             :raises UnsupportedImageError: The image is unsupported or has an error
             :raises ImageShapeError: The image has an invalid shape
+            :raises ValueError: The frame range or the crop results in an empty image or the channel does not exist
         """
         imgObj = ImageObject()
-        task = imgObj.open_file(Path(path), precompute=True, run_async=run_async)
+        task = imgObj.open_file(Path(path), precompute=True, run_async=run_async, lazy=lazy, frames=frames, crop=crop, channel=channel)
         task.add_callback(lambda: self.session.set_active_image_object(imgObj))
         if run_async:
             return task
@@ -23,6 +23,7 @@ else:
     app_data_path = platformdirs.user_data_path(appname="NeurotorchMZ", appauthor="andreasmz", roaming=False, ensure_exists=True)
 log_path = app_data_path / "logs.txt"
 tmp_path = app_data_path / "tmp"
+cache_path = app_data_path / "cache"
 environ_path = app_data_path / "environment"
 user_plugin_path = app_data_path / "plugins"
 preinstalled_plugin_path = Path(__file__).parent.parent / "plugins"
@@ -31,6 +32,7 @@ resource_path = Path(__file__).parent.parent / "resources"
 # Create the appdata folder if not exist
 app_data_path.mkdir(parents=True, exist_ok=True)
 tmp_path.mkdir(exist_ok=True, parents=False)
+cache_path.mkdir(exist_ok=True, parents=False)
 environ_path.mkdir(exist_ok=True, parents=False)
 user_plugin_path.mkdir(exist_ok=True, parents=False)
 
@@ -163,6 +165,16 @@ class UserSettings(Config):
         peak_width_left = IntOption(1)
         peak_width_right = IntOption(6)
 
+    class IMAGE_LOADING(Section):
+        lazy_loading = BoolOption(False)
+        lazy_delta = BoolOption(False)
+
+    class PERFORMANCE(Section):
+        worker_count = IntOption(0)
+        view_cache_mb = IntOption(0)
+        disk_cache = BoolOption(True)
+        disk_cache_mb = IntOption(1024)
+
 # Temp files
 def clear_temp_files():
     """ Clears the temporary files and folders """
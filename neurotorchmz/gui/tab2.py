@@ -194,8 +194,7 @@ class TabSignal(Tab):
                 _img = None
             else:
                 _img = imgObj.img[frame,:,:]
-            _vmin = imgObj.img_props.min
-            _vmax = imgObj.img_props.max
+            _vmin, _vmax = _range if (_range := imgObj.img_props.display_range()) is not None else (None, None)
             _cmap = "Greys_r"
             _title = ""
         else:
@@ -204,8 +203,8 @@ class TabSignal(Tab):
                 _img = None
             else:
                 _img = imgObj.img_diff[frame,:,:]
-            _vmin = imgObj.img_diff_props.minClipped
-            _vmax = imgObj.img_diff_props.max
+            _vmin, _vmax = _range if (_range := imgObj.img_diff_props.display_range(upper=99.9)) is not None else (None, None)
+            _vmin = max(0, _vmin) if _vmin is not None else None
             _cmap = "inferno"
             _title = "Difference Image"
 
@@ -225,7 +225,7 @@ class TabAnalysis(Tab):
             self.invalidate_ROIs()
             return
         
-        vmin, vmax = 0, imgObj.img_diff_props.max
+        vmin, vmax = 0, (_range[1] if (_range := imgObj.img_diff_props.display_range(upper=99.9)) is not None else None)
         self.ax2Image = self.ax2.imshow(imgObj.img_diff[frame], cmap="inferno", vmin=vmin, vmax=(float(vmax) if vmax is not None else vmax))
         self.ax2_colorbar = self.figure1.colorbar(self.ax2Image, ax=self.ax2)
         self.ax2.set_axis_on()
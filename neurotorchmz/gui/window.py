@@ -122,8 +122,13 @@ class Neurotorch_GUI:
             ("Slow drop", denoising.TRIGGER_FUNCTIONS.get_sliding_cumsum(n=6), True, "Sliding cumsum n=6"),
             ("Very slow peak", denoising.TRIGGER_FUNCTIONS.get_sliding_cumsum(n=9), False, "Sliding cumsum n=9"),
             ("Very slow drop", denoising.TRIGGER_FUNCTIONS.get_sliding_cumsum(n=9), True, "Sliding cumsum n=9"),
+            ("Peak (median filtered)", denoising.TRIGGER_FUNCTIONS.get_median_t_kernel(n=5), False, "Temporal median n=5"),
+            ("Drop (median filtered)", denoising.TRIGGER_FUNCTIONS.get_median_t_kernel(n=5), True, "Temporal median n=5"),
             ("Brightness relative to mean", denoising.TRIGGER_FUNCTIONS.get_baseline_delta(), False, "Baseline delta"),
             ("Darkness relative to mean", denoising.TRIGGER_FUNCTIONS.get_baseline_delta(invert=True), False, "Inverted baseline delta"),
+            ("Brightness relative to rolling mean", denoising.TRIGGER_FUNCTIONS.get_rolling_baseline_delta(window=100), False, "Rolling baseline delta"),
+            ("Darkness relative to rolling mean", denoising.TRIGGER_FUNCTIONS.get_rolling_baseline_delta(window=100, invert=True), False, "Inverted rolling baseline delta"),
+            ("Brightness relative to rolling 10th percentile", denoising.TRIGGER_FUNCTIONS.get_rolling_baseline_delta(window=100, percentile=10), False, "Rolling percentile baseline delta"),
         ]}
 
         for lbl, (var, fn, name) in self.denoise_xy_vars.items():
@@ -133,6 +138,12 @@ class Neurotorch_GUI:
             self.menu_trigger.add_checkbutton(label=lbl, command=lambda name=name, fn=fn, invert=invert: self.set_img_diff_trigger(name=name, trigger_fn=fn, invert=invert), variable=var)
 
         # Settings menu
+        self.var_lazy_loading = tk.BooleanVar(value=settings.UserSettings.IMAGE_LOADING.lazy_loading.get())
+        self.menu_settings.add_checkbutton(label="Lazy loading (do not load TIFF/ND2 files into memory)", variable=self.var_lazy_loading, 
+                                           command=lambda: settings.UserSettings.IMAGE_LOADING.lazy_loading.set(self.var_lazy_loading.get()))
+        self.var_lazy_delta = tk.BooleanVar(value=settings.UserSettings.IMAGE_LOADING.lazy_delta.get())
+        self.menu_settings.add_checkbutton(label="Calculate the delta video on demand (lower memory usage)", variable=self.var_lazy_delta, 
+                                           command=lambda: settings.UserSettings.IMAGE_LOADING.lazy_delta.set(self.var_lazy_delta.get()))
 
         # Plugins menu
         self.plugin_menus: dict[ModuleType, tk.Menu] = {}
@@ -188,7 +199,7 @@ class Neurotorch_GUI:
             imgObj =  self.session.active_image_object
             if imgObj is not None and imgObj.img is not None:
                 self.set_window_title(imgObj.name or "")
-                _size = round(sys.getsizeof(imgObj.img_raw)/(1024**2),2)
+                _size = round((imgObj.img_size if imgObj.img_size is not None else sys.getsizeof(imgObj.img_raw))/(1024**2),2)
                 self.statusbar.status_text = f"Image of shape {imgObj.img.shape} and size {_size} MB"
             else:
                 self.statusbar.status_text = ""
@@ -312,21 +323,9 @@ class Neurotorch_GUI:
     
     # Menu Buttons Click
 
-    def ask_ram_warning(self, factor: float) -> bool:
-        imgObj = self.session.active_image_object
-        if imgObj is None or imgObj.img_size is None or imgObj.img_raw is None:
-            return False
-        
-        match imgObj.img_raw.dtype:
-            case np.uint8|np.int8:
-                peak_size = imgObj.img_size/(1024**3)*factor
-            case np.uint16|np.int16:
-                peak_size = imgObj.img_size/(1024**3)*factor/2
-            case np.uint32|np.int32:
-                peak_size = imgObj.img_size/(1024**3)*factor/4
-            case _:
-                peak_size = imgObj.img_size/(1024**3)*factor/8
-
+    def ask_ram_warning(self, peak_bytes: int) -> bool:
+        """ Asks the user to confirm an action which may require up to peak_bytes of RAM if the free RAM is low. Returns True if the user wants to continue """
+        peak_size = peak_bytes/(1024**3)
         free_ram = Statusbar.get_free_ram_in_gb()
 
         if (free_ram - peak_size) >= 5:
@@ -343,9 +342,17 @@ class Neurotorch_GUI:
                 filetypes=(("All files", "*.*"), ("TIF File", "*.tif *.tiff"), ("ND2 Files (NIS Elements)", "*.nd2")) )
         if image_path is None or image_path == "":
             return
+        lazy = settings.UserSettings.IMAGE_LOADING.lazy_loading.get()
+        try:
+            probe = ImageObject.probe(Path(image_path))
+        except Exception:
+            logger.debug(f"Failed to probe '{Path(image_path).name}' before opening it:", exc_info=True)
+        else:
+            if not self.ask_ram_warning(probe.estimate_peak_bytes(precompute=True, lazy=lazy)):
+                return
         self.session.set_active_image_object(None)
         imgObj = ImageObject()
-        task = imgObj.open_file(Path(image_path), precompute=True, run_async=True)
+        task = imgObj.open_file(Path(image_path), precompute=True, run_async=True, lazy=lazy)
         task.add_callback(lambda: self.session.set_active_image_object(imgObj))
         task.set_error_callback(self._open_image_error_callback)
     
@@ -509,7 +516,7 @@ class Neurotorch_GUI:
             return
         savePath = settings.app_data_path / "img_peaks.dump"
         with open(savePath, 'wb') as f:
-            pickle.dump(_img, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((materialize(_img) if is_lazy(_img) else _img), f, protocol=pickle.HIGHEST_PROTOCOL)
         logger.info(f"Saved the delta video dump to APPDATA/img_peaks.dump")
 
     def menu_debug_enable_debugging_click(self):
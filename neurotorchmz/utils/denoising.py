@@ -1,9 +1,10 @@
 """ Common convolution functions for denoising an image """
 
 from .image import *
+from .parallel import worker_count
 
 import numpy as np
-from scipy.ndimage import gaussian_filter as _gaussian_filter, convolve
+from scipy.ndimage import gaussian_filter as _gaussian_filter, convolve, median_filter as _median_filter
 
 
 # def leap_gaussian_t_kernel(axis_image: AxisImage, sigma: float, negate: bool = False) -> AxisImage:
@@ -23,6 +24,8 @@ class PRE_FUNCTIONS:
     def invert(axis_img: AxisImage, axis_img_diff: AxisImage) -> AxisImage:
         return AxisImage(((-axis_img_diff.image) if axis_img_diff.image is not None else None), axis_img_diff.axis, axis_img_diff.name)
 
+set_function_metadata(PRE_FUNCTIONS.invert, block_stage=lambda axis_img, source: (np.negative, 0, source.dtype))
+
 
 class XY_DIFF_FUNCTIONS:
 
@@ -30,12 +33,60 @@ class XY_DIFF_FUNCTIONS:
 
     @staticmethod
     def gaussian_xy_kernel(img: np.ndarray, sigma: float) -> np.ndarray:
-        _img_max, _img_min, _img_dtype = np.max(img), np.min(img), img.dtype
-        r = _gaussian_filter(img, sigma=sigma, axes=(1,2), output="float32") # Peak 1 float32
-        r: np.ndarray = (r*(_img_max/r.max()).astype(r.dtype)).astype(_img_dtype) # Peak 2 float32
-        #r = (_img_min.astype(r.dtype) + (r + r.min()) / (r.max() - r.min())*(_img_max-_img_min).astype(r.dtype)).astype(_img_dtype)
+        """ 
+            Applies a gaussian filter on every frame and rescales the result to the maximum of the image. The frames are filtered chunk wise in the shared
+            thread pool (see the setting PERFORMANCE.worker_count) directly into an output array of the image dtype
+        """
+        r = np.empty(shape=img.shape, dtype=img.dtype)
+        _chunk_size = frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS*img.dtype.itemsize)
+        if img.dtype == np.float32:
+            # The filtered image can be written directly into the output and rescaled afterwards
+            def _filter_float(c: tuple[int, np.ndarray]) -> np.float32:
+                start, chunk = c
+                return np.max(_gaussian_filter(chunk, sigma=sigma, axes=(1,2), output=r[start:(start + chunk.shape[0])]))
+            _filtered_max = max(parallel_map(_filter_float, iter_chunks(img, _chunk_size)))
+            _scale = (np.max(img)/_filtered_max).astype("float32")
+            for _ in parallel_map(lambda c: np.multiply(c[1], _scale, out=c[1]), iter_chunks(r, _chunk_size)):
+                pass
+            return r
+        _scale = XY_DIFF_FUNCTIONS._gaussian_xy_scale(img, sigma)
+        def _filter(c: tuple[int, np.ndarray]) -> None:
+            start, chunk = c
+            _r = _gaussian_filter(chunk, sigma=sigma, axes=(1,2), output="float32")
+            np.multiply(_r, _scale, out=_r)
+            r[start:(start + chunk.shape[0])] = _r
+        for _ in parallel_map(_filter, iter_chunks(img, _chunk_size)):
+            pass
         return r
     
+    @staticmethod
+    def gaussian_xy_kernel_lazy(img: np.ndarray|LazyImageStack, sigma: float) -> LazyImageStack:
+        """ Out-of-core version of gaussian_xy_kernel(), which returns a MappedImageStack """
+        _scale = XY_DIFF_FUNCTIONS._gaussian_xy_scale(img, sigma)
+        return MappedImageStack(img, lambda block: _gaussian_filter(block, sigma=sigma, axes=(1,2), output="float32")*_scale, dtype=img.dtype)
+
+    @staticmethod
+    def _gaussian_xy_scale(img: np.ndarray|LazyImageStack, sigma: float) -> np.float32:
+        """
+            Returns the factor rescaling the filtered image to the maximum of the image. As the filtered frame can't exceed the maximum of the frame, 
+            the frames are filtered in the order of their maximum until no remaining frame can exceed the filtered maximum found so far. Usually only
+            a few frames need to be filtered. Returns 1 for an empty image or if the filtered maximum is zero
+        """
+        if img.shape[0] == 0:
+            return np.float32(1)
+        frame_max = stack_statistics(img, axis=(1,2), ops=("max",))["max"]
+        order = np.argsort(frame_max)[::-1]
+        n = frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS*img.dtype.itemsize//4)
+        _blocks = (np.sort(order[i:(i+n)]) for i in range(0, len(order), n))
+        _max = None
+        for i, m in enumerate(parallel_map(lambda b: np.max(_gaussian_filter(np.asarray(img[b]), sigma=sigma, axes=(1,2), output="float32")), _blocks)):
+            _max = m if _max is None else max(_max, m)
+            if (i+1)*n >= len(order) or frame_max[order[(i+1)*n]] <= _max:
+                break
+        if _max is None or _max == 0:
+            return np.float32(1)
+        return (frame_max[order[0]]/_max).astype("float32")
+
     @staticmethod
     def get_gaussian_xy_kernel(sigma: float) -> Callable[[AxisImage, AxisImage], AxisImage]:
         def _wrapper(axis_img: AxisImage, axis_img_diff: AxisImage, sigma=sigma) -> AxisImage:
@@ -43,10 +94,16 @@ class XY_DIFF_FUNCTIONS:
             if img is None:
                 return axis_img_diff.copy()
             t0 = time.perf_counter()
-            r = XY_DIFF_FUNCTIONS.gaussian_xy_kernel(img, sigma=sigma)
+            if is_lazy(img):
+                r = XY_DIFF_FUNCTIONS.gaussian_xy_kernel_lazy(img, sigma=sigma)
+            else:
+                r = XY_DIFF_FUNCTIONS.gaussian_xy_kernel(img, sigma=sigma)
             logger.debug(f"Calculated gaussian xy kernel in {(time.perf_counter()-t0):1.3f} s")
             return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
-        return _wrapper
+        def _stage(axis_img: AxisImage|None, source: np.ndarray|LazyImageStack) -> tuple[Callable[[np.ndarray], np.ndarray], int, Any]:
+            _scale = XY_DIFF_FUNCTIONS._gaussian_xy_scale(source, sigma)
+            return (lambda block: _gaussian_filter(block, sigma=sigma, axes=(1,2), output="float32")*_scale), 0, source.dtype
+        return set_function_metadata(_wrapper, cache_key=f"XY_DIFF_FUNCTIONS.gaussian_xy_kernel(sigma={sigma})", block_stage=_stage)
 
 
 class TRIGGER_FUNCTIONS:
@@ -55,20 +112,100 @@ class TRIGGER_FUNCTIONS:
 
     
     @staticmethod
-    def gaussian_t_kernel(img: np.ndarray, sigma: float) -> np.ndarray:
+    def gaussian_t_kernel(img: np.ndarray, sigma: float, method: Literal["fir", "iir"] = "fir") -> np.ndarray:
+        """
+            Returns the negated image filtered with a gaussian kernel along the temporal axis
+
+            :param Literal["fir", "iir"] method: 'fir' convolves with a truncated gaussian kernel in the image dtype, whose cost grows linearly with sigma. 
+                'iir' uses a recursive gaussian (see recursive_gaussian_t) with constant cost per frame and returns a float32 image. For sigma < 0.5, 
+                the recursive filter is not defined and 'fir' is used
+        """
+        if method == "iir" and sigma >= 0.5:
+            r = TRIGGER_FUNCTIONS.recursive_gaussian_t(img, sigma=sigma)
+            return np.negative(r, out=r)
         return -_gaussian_filter(img, sigma=sigma, axes=(0), output=img.dtype)
     
     @staticmethod
-    def get_gaussian_t_kernel(sigma: float) -> Callable[[AxisImage, AxisImage], AxisImage]:
+    def recursive_gaussian_t(img: np.ndarray, sigma: float) -> np.ndarray:
+        """
+            Filters the image along the temporal axis with the recursive gaussian filter of Young and van Vliet (a causal and an anti causal third order 
+            IIR filter) and returns a float32 image. The cost per frame does not depend on sigma. The stack is processed in bands of rows in parallel and 
+            streamed frame by frame, so that apart from the output only frame sized buffers are needed. The borders are handled by assuming a constant 
+            continuation of the first and last frame (like mode 'nearest' of scipy): The causal pass starts in the steady state of the first frame and the
+            anti causal pass is initialized with the boundary values of Triggs and Sdika (2006). As the filter has an infinite support, block wise 
+            application (e.g. for lazy images) uses a halo of 8 sigma (see _gaussian_t_halo), which limits the relative deviation from filtering the whole
+            stack to about 1e-6
+        """
+        if img.shape[0] == 0:
+            return np.zeros(shape=img.shape, dtype=np.float32)
+        if sigma >= 2.5:
+            q = 0.98711*sigma - 0.96330
+        else:
+            q = 3.97156 - 4.14554*np.sqrt(1 - 0.26891*sigma)
+        b0 = 1.57825 + 2.44413*q + 1.4281*q**2 + 0.422205*q**3
+        b1 = 2.44413*q + 2.85619*q**2 + 1.26661*q**3
+        b2 = -(1.4281*q**2 + 1.26661*q**3)
+        b3 = 0.422205*q**3
+        B, a1, a2, a3 = 1 - (b1 + b2 + b3)/b0, b1/b0, b2/b0, b3/b0
+        # Maps the deviation of the last three causal outputs from the steady state to the deviation of the first anti causal states (Triggs and Sdika)
+        M = B/((1 + a1 - a2 + a3)*(1 - a1 - a2 - a3)*(1 + a2 + (a1 - a3)*a3))*np.array([
+            [-a3*a1 + 1 - a3*a3 - a2, (a3 + a1)*(a2 + a3*a1), a3*(a1 + a3*a2)],
+            [a1 + a3*a2, -(a2 - 1)*(a2 + a3*a1), -a3*(a3*a1 + a3*a3 + a2 - 1)],
+            [a3*a1 + a2 + a1*a1 - a2*a2, a1*a2 + a3*a2*a2 - a1*a3*a3 - a3*a3*a3 - a3*a2 + a3, a3*(a1 + a3*a2)],
+        ])
+
+        r = np.empty(shape=img.shape, dtype=np.float32)
+        rows = -(-img.shape[1] // worker_count())
+        def _recursion(frames: range, src: np.ndarray, out: np.ndarray, w1: np.ndarray, w2: np.ndarray, w3: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+            acc, tmp = np.empty_like(w1), np.empty_like(w1)
+            for t in frames:
+                np.multiply(src[t], B, out=acc)
+                np.multiply(w1, a1, out=tmp)
+                acc += tmp
+                np.multiply(w2, a2, out=tmp)
+                acc += tmp
+                np.multiply(w3, a3, out=tmp)
+                acc += tmp
+                out[t] = acc
+                w1, w2, w3, acc = acc, w1, w2, w3
+            return w1, w2, w3
+        def _band(y0: int) -> None:
+            band, out = img[:, y0:(y0 + rows)], r[:, y0:(y0 + rows)]
+            _t = img.shape[0]
+            w = [np.asarray(band[0], dtype=np.float64).copy() for _ in range(3)]
+            w = _recursion(range(_t), band, out, *w)
+            x_last = np.asarray(band[_t - 1], dtype=np.float64)
+            v = [sum(M[i, j]*(w[j] - x_last) for j in range(3)) + x_last for i in range(3)]
+            out[_t - 1] = v[0]
+            _recursion(range(_t - 2, -1, -1), out, out, *v)
+        for _ in parallel_map(_band, range(0, img.shape[1], rows)):
+            pass
+        return r
+    
+    @staticmethod
+    def _gaussian_t_halo(sigma: float, method: Literal["fir", "iir"]) -> int:
+        """ Returns the number of neighbouring frames needed to filter a block of frames with gaussian_t_kernel """
+        if method == "iir" and sigma >= 0.5:
+            return int(8*sigma + 0.5)
+        return int(4*sigma + 0.5)
+
+    @staticmethod
+    def get_gaussian_t_kernel(sigma: float, method: Literal["fir", "iir"] = "fir") -> Callable[[AxisImage, AxisImage], AxisImage]:
         def _wrapper(axis_img: AxisImage, axis_img_diff: AxisImage, sigma=sigma) -> AxisImage:
             img = axis_img_diff.image
             if img is None:
                 return axis_img_diff.copy()
             t0 = time.perf_counter()
-            r = TRIGGER_FUNCTIONS.gaussian_t_kernel(img, sigma=sigma)
+            if is_lazy(img):
+                _dtype = np.float32 if (method == "iir" and sigma >= 0.5) else img.dtype
+                r = MappedImageStack(img, lambda block: TRIGGER_FUNCTIONS.gaussian_t_kernel(block, sigma=sigma, method=method), dtype=_dtype, halo=TRIGGER_FUNCTIONS._gaussian_t_halo(sigma, method))
+            else:
+                r = TRIGGER_FUNCTIONS.gaussian_t_kernel(img, sigma=sigma, method=method)
             logger.debug(f"Calculated gaussian t kernel in {(time.perf_counter()-t0):1.3f} s")
             return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
-        return _wrapper
+        _stage = lambda axis_img, source: ((lambda block: TRIGGER_FUNCTIONS.gaussian_t_kernel(block, sigma=sigma, method=method)), TRIGGER_FUNCTIONS._gaussian_t_halo(sigma, method), 
+                                           (np.float32 if (method == "iir" and sigma >= 0.5) else source.dtype))
+        return set_function_metadata(_wrapper, cache_key=f"TRIGGER_FUNCTIONS.gaussian_t_kernel(sigma={sigma}, method={method})", block_stage=_stage)
 
     @staticmethod
     def baseline_delta(img_spatial_mean: np.ndarray, img: np.ndarray, invert: bool) -> np.ndarray:
@@ -82,32 +219,220 @@ class TRIGGER_FUNCTIONS:
             if axis_img.image is None:
                 return axis_img_diff.copy()
             t0 = time.perf_counter()
-            img_mean = AxisImage(axis_img.image, ImageView.SPATIAL.value, (axis_img.name if axis_img.name is not None else "")+"_tmp").mean_image
+            if axis_img.context is not None and (_view := axis_img.context.img_view(ImageView.SPATIAL)) is not None and _view.image is axis_img.image:
+                img_mean = _view.mean_image # Reuse the cached spatial mean of the ImageObject
+            else:
+                img_mean = AxisImage(axis_img.image, ImageView.SPATIAL.value, (axis_img.name if axis_img.name is not None else "")+"_tmp").mean_image
             if img_mean is None:
                 return axis_img_diff.copy()
-            r = TRIGGER_FUNCTIONS.baseline_delta(img_mean, axis_img.image, invert=invert)
+            if is_lazy(axis_img.image):
+                _fn = (lambda block: img_mean[None, :, :] - block) if invert else (lambda block: block - img_mean[None, :, :])
+                r = MappedImageStack(axis_img.image, _fn, dtype=np.result_type(axis_img.image.dtype, img_mean.dtype), offset=1)
+            else:
+                r = TRIGGER_FUNCTIONS.baseline_delta(img_mean, axis_img.image, invert=invert)
             logger.debug(f"Calculated baseline delta in {(time.perf_counter()-t0):1.3f} s")
             return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
-        return _wrapper
+        return set_function_metadata(_wrapper, cache_key=f"TRIGGER_FUNCTIONS.baseline_delta(invert={invert})")
     
 
     @staticmethod
-    def sliding_cumsum(img: np.ndarray, n: int) -> np.ndarray:
-        a1 = np.full(shape=(n), fill_value=1)
-        a2 = np.full(shape=(n), fill_value=0)
-        c = np.concatenate([a2, np.array([1]), a1])
-        c = c[:, None, None]
+    def rolling_baseline_delta(img: np.ndarray, window: int, percentile: float|None = None, invert: bool = False, offset: int = 0) -> np.ndarray:
+        """
+            Returns the frames img[1:] relative to a rolling baseline as float32 image. The baseline of a frame is the mean (or the given percentile) of 
+            the preceding window frames (fewer at the stack start). The mean is updated incrementally with a running sum. The percentile is updated 
+            every window//4 frames over the preceding window. It is recalculated at each update point instead of being maintained incrementally: 
+            keeping a sorted window per pixel costs O(window) per pixel and frame for shifting, while a selection every window//4 frames costs only 
+            about four element operations per pixel and frame. Bands of rows are processed in parallel
+
+            :param bool invert: Return the baseline minus the frame instead
+            :param int offset: Absolute index of the first frame of img, if img is a block of a larger stack. The percentile update points are based on
+                absolute frame indices, so that the result does not depend on how a stack is split into blocks
+        """
+        window = max(1, int(window))
+        r = np.empty(shape=(max(img.shape[0] - 1, 0), *img.shape[1:]), dtype=np.float32)
+        rows = -(-img.shape[1] // worker_count())
+        step = max(1, window // 4)
+        def _band(y0: int) -> None:
+            band, out = img[:, y0:(y0 + rows)], r[:, y0:(y0 + rows)]
+            baseline = np.zeros(shape=band.shape[1:], dtype=np.float64)
+            acc = np.zeros(shape=band.shape[1:], dtype=np.float64)
+            for t in range(1, img.shape[0]):
+                if percentile is None:
+                    acc += band[t-1]
+                    if t - 1 - window >= 0:
+                        acc -= band[t - 1 - window]
+                    np.divide(acc, min(t, window), out=baseline)
+                elif (offset + t - 1) % step == 0:
+                    baseline = np.percentile(band[max(0, t - window):t], percentile, axis=0)
+                if invert:
+                    np.subtract(baseline, band[t], out=out[t-1], casting="unsafe")
+                else:
+                    np.subtract(band[t], baseline, out=out[t-1], casting="unsafe")
+        for _ in parallel_map(_band, range(0, img.shape[1], rows)):
+            pass
+        return r
+
+    @staticmethod
+    def get_rolling_baseline_delta(window: int, percentile: float|None = None, invert: bool = False) -> Callable[[AxisImage, AxisImage], AxisImage]:
+        def _wrapper(axis_img: AxisImage, axis_img_diff: AxisImage) -> AxisImage:
+            img = axis_img.image
+            if img is None:
+                return axis_img_diff.copy()
+            t0 = time.perf_counter()
+            if is_lazy(img):
+                # The inner stack provides a (zero) result also for the first frame of a block, so that the result has the shape of the block. As the 
+                # result starts with img[1], the outer stack skips the first frame. The halo covers the window preceding the last percentile update point
+                _fn = lambda block, start: np.concatenate([np.zeros_like(block[:1], dtype=np.float32), TRIGGER_FUNCTIONS.rolling_baseline_delta(block, window=window, percentile=percentile, invert=invert, offset=start)])
+                _halo = max(1, int(window)) + (max(1, int(window) // 4) if percentile is not None else 0)
+                r = MappedImageStack(MappedImageStack(img, _fn, dtype=np.float32, halo=_halo, pass_start=True), lambda block: block, dtype=np.float32, offset=1)
+            else:
+                r = TRIGGER_FUNCTIONS.rolling_baseline_delta(img, window=window, percentile=percentile, invert=invert)
+            logger.debug(f"Calculated rolling baseline delta in {(time.perf_counter()-t0):1.3f} s")
+            return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
+        return set_function_metadata(_wrapper, cache_key=f"TRIGGER_FUNCTIONS.rolling_baseline_delta(window={window}, percentile={percentile}, invert={invert})")
+
+    @staticmethod
+    def sliding_cumsum(img: np.ndarray, n: int, method: Literal["running", "convolve"] = "running") -> np.ndarray:
+        """
+            Returns for every frame the mean (floor divided) of the frame and its n predecessors. The stack start is handled by reflecting the image.
+
+            :param Literal["running", "convolve"] method: 'running' updates a running window sum in a wide accumulator dtype (int64 or float64) frame by
+                frame, so that the cost does not depend on n and sums can't overflow. Bands of rows are processed in parallel. 'convolve' uses a convolution
+                in the image dtype
+        """
+        if method == "convolve":
+            a1 = np.full(shape=(n), fill_value=1)
+            a2 = np.full(shape=(n), fill_value=0)
+            c = np.concatenate([a2, np.array([1]), a1])
+            c = c[:, None, None]
 
-        return np.floor_divide(convolve(img, c, output=img.dtype), n+1, dtype=img.dtype)
+            return np.floor_divide(convolve(img, c, output=img.dtype), n+1, dtype=img.dtype)
+        
+        if img.shape[0] == 0:
+            return np.zeros_like(img)
+        _acc_dtype = np.dtype("float64") if img.dtype.kind == "f" else np.dtype("int64")
+        _t = img.shape[0]
+        _src = lambda q: (q % (2*_t)) if (q % (2*_t)) < _t else (2*_t - 1 - q % (2*_t)) # Reflects frame indices before the stack start like scipy
+        r = np.empty(shape=img.shape, dtype=img.dtype)
+        rows = -(-img.shape[1] // worker_count())
+        def _band(y0: int) -> None:
+            band, out = img[:, y0:(y0 + rows)], r[:, y0:(y0 + rows)]
+            acc = np.zeros(shape=band.shape[1:], dtype=_acc_dtype)
+            for q in range(-n, 1):
+                acc += band[_src(q)]
+            np.floor_divide(acc, n+1, out=out[0], casting="unsafe")
+            for t in range(1, _t):
+                acc += band[t]
+                acc -= band[_src(t - n - 1)]
+                np.floor_divide(acc, n+1, out=out[t], casting="unsafe")
+        for _ in parallel_map(_band, range(0, img.shape[1], rows)):
+            pass
+        return r
     
     @staticmethod
-    def get_sliding_cumsum(n: int) -> Callable[[AxisImage, AxisImage], AxisImage]:
+    def get_sliding_cumsum(n: int, method: Literal["running", "convolve"] = "running") -> Callable[[AxisImage, AxisImage], AxisImage]:
         def _wrapper(axis_img: AxisImage, axis_img_diff: AxisImage, n = n) -> AxisImage:
             img = axis_img_diff.image
             if img is None:
                 return axis_img_diff.copy()
             t0 = time.perf_counter()
-            r = TRIGGER_FUNCTIONS.sliding_cumsum(img, n=n)
+            if is_lazy(img):
+                r = MappedImageStack(img, lambda block: TRIGGER_FUNCTIONS.sliding_cumsum(block, n=n, method=method), dtype=img.dtype, halo=n)
+            else:
+                r = TRIGGER_FUNCTIONS.sliding_cumsum(img, n=n, method=method)
             logger.debug(f"Calculated sliding cumsum kernel in {(time.perf_counter()-t0):1.3f} s")
             return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
-        return _wrapper
\ No newline at end of file
+        return set_function_metadata(_wrapper, cache_key=f"TRIGGER_FUNCTIONS.sliding_cumsum(n={n}, method={method})", 
+                                     block_stage=lambda axis_img, source: ((lambda block: TRIGGER_FUNCTIONS.sliding_cumsum(block, n=n, method=method)), n, source.dtype))
+
+    MEDIAN_HIST_BYTES: int = 32*1024*1024
+    """ Memory budget of the per pixel histograms of one block of pixels in median_t_kernel """
+    MEDIAN_HIST_MIN_N: int = 5
+    """ Smallest n for which median_t_kernel uses the histogram based filter """
+    MEDIAN_HIST_MAX_BINS: int = 4096
+    """ Largest value range (number of histogram bins) for which median_t_kernel uses the histogram based filter """
+    MEDIAN_HIST_BINS_PER_VALUE: int = 32
+    """ Largest ratio of the value range to the window size (2n+1) for which median_t_kernel uses the histogram based filter """
+
+    @staticmethod
+    def median_t_kernel(img: np.ndarray, n: int) -> np.ndarray:
+        """
+            Returns the temporal median of every frame and its n predecessors and successors (window of 2n+1 frames). The borders are handled by reflecting
+            the image like scipy. Integer images are filtered with Huang's algorithm: Every pixel keeps a histogram of its window and the position of the
+            median in it. When the window moves by one frame, one value is removed and one is added, so that the median only moves to the neighboring
+            occupied value and the cost per frame nearly does not depend on n. Blocks of pixels are processed in parallel. As the median moves one bin per 
+            step, the histograms are only used if the value range is small compared to the window (see MEDIAN_HIST_BINS_PER_VALUE and 
+            MEDIAN_HIST_MAX_BINS). Float images, small windows (n < MEDIAN_HIST_MIN_N), where sorting the few values is faster, and wide value ranges fall 
+            back to scipy's median filter in parallel bands of rows
+        """
+        n = max(0, int(n))
+        _t = img.shape[0]
+        r = np.empty(shape=img.shape, dtype=img.dtype)
+        if n == 0 or _t == 0:
+            r[:] = img
+            return r
+        nbins = (int(np.max(img)) - int(np.min(img)) + 1) if img.dtype.kind in "ui" else 0
+        if nbins == 0 or n < TRIGGER_FUNCTIONS.MEDIAN_HIST_MIN_N or nbins > min(TRIGGER_FUNCTIONS.MEDIAN_HIST_MAX_BINS, TRIGGER_FUNCTIONS.MEDIAN_HIST_BINS_PER_VALUE*(2*n+1)):
+            rows = -(-img.shape[1] // worker_count())
+            def _rows(y0: int) -> None:
+                r[:, y0:(y0 + rows)] = _median_filter(img[:, y0:(y0 + rows)], size=(2*n+1, 1, 1), mode="reflect")
+            for _ in parallel_map(_rows, range(0, img.shape[1], rows)):
+                pass
+            return r
+
+        _src = lambda q: (q % (2*_t)) if (q % (2*_t)) < _t else (2*_t - 1 - q % (2*_t)) # Reflects frame indices at both borders like scipy
+        k = n # Rank of the median in the window of 2n+1 values
+        vmin = int(np.min(img))
+        _count_dtype = np.dtype("uint16") if 2*n+1 < 2**16 else np.dtype("uint32")
+        img_flat, r_flat = img.reshape(_t, -1), r.reshape(_t, -1)
+        pixels = max(64, min(TRIGGER_FUNCTIONS.MEDIAN_HIST_BYTES // (nbins*_count_dtype.itemsize), -(-img_flat.shape[1] // worker_count())))
+        def _block(p0: int) -> None:
+            block, out = img_flat[:, p0:(p0 + pixels)], r_flat[:, p0:(p0 + pixels)]
+            _frame = lambda q: block[_src(q)].astype(np.int64) - vmin
+            base = np.arange(block.shape[1], dtype=np.int64)*nbins
+            hist = np.zeros(shape=(block.shape[1]*nbins), dtype=_count_dtype)
+            window = np.stack([_frame(q) for q in range(-n, n+1)])
+            for w in window:
+                hist[base + w] += 1
+            m = np.partition(window, k, axis=0)[k] # The median value of every pixel
+            lt = np.count_nonzero(window < m[None, :], axis=0).astype(np.int64) # The number of window values smaller than the median
+            del window
+            out[0] = m + vmin
+            for t in range(1, _t):
+                v_out, v_in = _frame(t - n - 1), _frame(t + n)
+                hist[base + v_out] -= 1
+                lt -= v_out < m
+                hist[base + v_in] += 1
+                lt += v_in < m
+                # Move the median down while more than k values are smaller than it
+                idx = np.flatnonzero(lt > k)
+                while len(idx) > 0:
+                    m[idx] -= 1
+                    lt[idx] -= hist[base[idx] + m[idx]]
+                    idx = idx[lt[idx] > k]
+                # Move the median up while the values smaller or equal to it are not more than k
+                idx = np.flatnonzero(lt + hist[base + m] <= k)
+                while len(idx) > 0:
+                    lt[idx] += hist[base[idx] + m[idx]]
+                    m[idx] += 1
+                    idx = idx[lt[idx] + hist[base[idx] + m[idx]] <= k]
+                out[t] = m + vmin
+        for _ in parallel_map(_block, range(0, img_flat.shape[1], pixels)):
+            pass
+        return r
+    
+    @staticmethod
+    def get_median_t_kernel(n: int) -> Callable[[AxisImage, AxisImage], AxisImage]:
+        def _wrapper(axis_img: AxisImage, axis_img_diff: AxisImage, n = n) -> AxisImage:
+            img = axis_img_diff.image
+            if img is None:
+                return axis_img_diff.copy()
+            t0 = time.perf_counter()
+            if is_lazy(img):
+                r = MappedImageStack(img, lambda block: TRIGGER_FUNCTIONS.median_t_kernel(block, n=n), dtype=img.dtype, halo=n)
+            else:
+                r = TRIGGER_FUNCTIONS.median_t_kernel(img, n=n)
+            logger.debug(f"Calculated temporal median kernel in {(time.perf_counter()-t0):1.3f} s")
+            return AxisImage(r, axis=axis_img_diff.axis, name=axis_img_diff.name)
+        return set_function_metadata(_wrapper, cache_key=f"TRIGGER_FUNCTIONS.median_t_kernel(n={n})", 
+                                     block_stage=lambda axis_img, source: ((lambda block: TRIGGER_FUNCTIONS.median_t_kernel(block, n=n)), n, source.dtype))
@@ -0,0 +1,104 @@
+""" 
+    Persistent cache for derived images (for example the spatial mean or the signal) of image files. The entries are stored as npz files in the AppData 
+    cache folder and are keyed by the identity of the file (size, modification time and a hash of sampled content) and a key describing the content 
+"""
+from ..core.logs import logger
+from ..core.settings import UserSettings, cache_path
+
+from pathlib import Path
+import hashlib
+import os
+import time
+import numpy as np
+
+SAMPLE_BYTES: int = 64*1024
+""" Number of bytes read at the start, the middle and the end of a file to build its fingerprint """
+
+def enabled() -> bool:
+    """ Returns True if the disk cache is enabled in the settings (PERFORMANCE.disk_cache) """
+    return UserSettings.PERFORMANCE.disk_cache.get()
+
+def file_fingerprint(path: Path, *args) -> str:
+    """ 
+        Returns a fingerprint of the file build from its size, modification time and a hash of sampled content. Additional arguments (for example the 
+        loaded frame range) are included into the fingerprint
+    """
+    stat = path.stat()
+    h = hashlib.sha1(f"{stat.st_size}|{stat.st_mtime_ns}|{'|'.join(repr(a) for a in args)}".encode())
+    with open(path, "rb") as f:
+        for offset in sorted({0, max(0, stat.st_size//2 - SAMPLE_BYTES//2), max(0, stat.st_size - SAMPLE_BYTES)}):
+            f.seek(offset)
+            h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+def _entry_path(fingerprint: str, key: str) -> Path:
+    return cache_path / f"{fingerprint[:24]}_{hashlib.sha1(key.encode()).hexdigest()[:16]}.npz"
+
+def load(fingerprint: str, key: str) -> dict[str, np.ndarray]|None:
+    """ Returns the arrays stored for the given fingerprint and key or None if there is no such entry """
+    path = _entry_path(fingerprint, key)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            r = {k: npz[k] for k in npz.files}
+        os.utime(path) # The modification time is used to remove the least recently used entries
+    except Exception:
+        logger.warning(f"Failed to read the cache entry '{path.name}'. Removing it", exc_info=True)
+        path.unlink(missing_ok=True)
+        return None
+    logger.debug(f"Loaded {len(r)} arrays for '{key}' from the disk cache")
+    return r
+
+def contains(fingerprint: str, key: str) -> bool:
+    """ Returns True if there is an entry for the given fingerprint and key. Only the member list of the archive is read """
+    path = _entry_path(fingerprint, key)
+    if not path.exists():
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            return len(npz.files) > 0
+    except Exception:
+        return False
+
+def store(fingerprint: str, key: str, arrays: dict[str, np.ndarray]) -> None:
+    """ Stores the arrays for the given fingerprint and key. Arrays already stored under other names are kept """
+    if len(arrays) == 0:
+        return
+    path = _entry_path(fingerprint, key)
+    _arrays = load(fingerprint, key) or {}
+    if all(k in _arrays and _arrays[k].shape == np.shape(v) for k, v in arrays.items()):
+        return
+    _arrays.update(arrays)
+    tmp = path.with_suffix(".tmp.npz")
+    try:
+        np.savez(tmp, **_arrays)
+        os.replace(tmp, path)
+    except Exception:
+        logger.warning(f"Failed to write the cache entry '{path.name}'", exc_info=True)
+        tmp.unlink(missing_ok=True)
+        return
+    logger.debug(f"Stored {len(_arrays)} arrays for '{key}' in the disk cache")
+    prune()
+
+def prune(max_bytes: int|None = None) -> None:
+    """ Removes the least recently used entries until the cache is smaller than max_bytes (defaults to the setting PERFORMANCE.disk_cache_mb) """
+    if max_bytes is None:
+        max_bytes = UserSettings.PERFORMANCE.disk_cache_mb.get()*1024**2
+    t0 = time.perf_counter()
+    entries = sorted([(p.stat().st_mtime, p.stat().st_size, p) for p in cache_path.glob("*.npz")], key=lambda e: e[0])
+    size = sum(e[1] for e in entries)
+    count = 0
+    for _, entry_size, p in entries:
+        if size <= max_bytes:
+            break
+        p.unlink(missing_ok=True)
+        size -= entry_size
+        count += 1
+    if count > 0:
+        logger.debug(f"Removed {count} entries from the disk cache in {(time.perf_counter() - t0):1.3f} s")
+
+def clear() -> None:
+    """ Removes all entries from the disk cache """
+    for p in cache_path.glob("*.npz"):
+        p.unlink(missing_ok=True)
@@ -1,39 +1,85 @@
 from ..core.task_system import Task  
 from ..core.serialize import Serializable, DeserializeError, SerializeError
 from ..core.logs import logger
+from ..core.settings import UserSettings
+from .lazy_image import LazyImageStack, DeltaImageStack, MappedImageStack, SubImageStack, FrameIndexStack, TiffPageStack, ND2FrameStack, open_tiff_lazy, open_nd2_lazy, is_lazy, materialize, iter_chunks, frames_per_chunk, subset_indices
+from .image_stats import STAT_OPS, STAT_CHUNK_ELEMENTS, StackStatisticsStream, stack_statistics, stack_median, stack_percentile
+from .parallel import parallel_map
+from . import disk_cache
 
 import collections
 from dataclasses import asdict
 from enum import Enum
-from typing import Callable, Self, Any, cast, Literal
+from typing import Callable, Self, Any, cast, Literal, TypeVar
 import numpy as np
 import pims
 import tifffile
 import nd2
 from pathlib import Path
 import gc
+import hashlib
 import time
+import psutil
+import threading
+import weakref
 
 class ImageProperties:
     """
         A class that supports lazy loading and caching of image properties like mean, median, std, min, max and clippedMin (=np.min(0, self.min))
         Returns scalars (except for the img property, where it returns the image used to initializate this object.
+
+        :var bool APPROXIMATE_FLOAT_MEDIAN: If set, the median of float image stacks is approximated by a histogram instead of being calculated exactly
+        :var int DISPLAY_RANGE_SAMPLES: Maximum number of values sampled for estimating the display range
+        :var int DISPLAY_RANGE_FRAMES: Maximum number of (evenly spaced) frames of an image stack sampled for estimating the display range
     """
-    def __init__(self, img: np.ndarray|None):
+
+    APPROXIMATE_FLOAT_MEDIAN: bool = False
+    DISPLAY_RANGE_SAMPLES: int = 2**20
+    DISPLAY_RANGE_FRAMES: int = 64
+
+    def __init__(self, img: np.ndarray|LazyImageStack|None):
         self._img = img
         self._mean = None
         self._std = None
         self._median = None
         self._min = None
         self._max = None
+        self._sample = None
+
 
+    def _compute_statistics(self) -> None:
+        """ Calculates mean, std, min and max. For image stacks, all missing values are calculated in a single chunked pass """
+        _missing = [op for op in STAT_OPS if getattr(self, f"_{op}") is None]
+        if self._img is None or len(_missing) == 0:
+            return
+        if len(self._img.shape) == 3:
+            r = stack_statistics(self._img, axis=None, ops=_missing)
+        else:
+            r = {"mean": np.mean, "std": np.std, "min": np.min, "max": np.max}
+            r = {op: r[op](self._img) for op in _missing}
+        for op in _missing:
+            setattr(self, f"_{op}", r[op])
+
+    def set_statistics(self, stats: dict[str, Any], dtype: Any = None) -> None:
+        """ Set already calculated statistics (e.g. from a StackStatisticsStream) if not yet cached. Min and max are converted to the given dtype """
+        for op in (*STAT_OPS, "median"):
+            if stats.get(op, None) is None or getattr(self, f"_{op}") is not None:
+                continue
+            v = stats[op]
+            if op in ("min", "max") and dtype is not None:
+                v = np.dtype(dtype).type(v)
+            setattr(self, f"_{op}", v)
+
+    def get_statistics(self) -> dict[str, Any]:
+        """ Returns the already calculated statistics (mean, std, min, max and median) """
+        return {op: getattr(self, f"_{op}") for op in (*STAT_OPS, "median") if getattr(self, f"_{op}") is not None}
 
     @property
     def mean(self) -> np.floating|None:
         if self._img is None:
             return None
         if self._mean is None:
-            self._mean = np.mean(self._img)
+            self._compute_statistics()
         return self._mean
     
     @property
@@ -41,7 +87,10 @@ class ImageProperties:
         if self._img is None:
             return None
         if self._median is None:
-            self._median = np.median(self._img)
+            if len(self._img.shape) == 3:
+                self._median = stack_median(self._img, axis=None, vmin=self.min, vmax=self.max, approximate=ImageProperties.APPROXIMATE_FLOAT_MEDIAN)
+            else:
+                self._median = np.median(self._img)
         return self._median
     
     @property
@@ -49,7 +98,7 @@ class ImageProperties:
         if self._img is None:
             return None
         if self._std is None:
-            self._std = np.std(self._img)
+            self._compute_statistics()
         return self._std
     
     @property
@@ -57,7 +106,7 @@ class ImageProperties:
         if self._img is None:
             return None
         if self._min is None:
-            self._min = np.min(self._img)
+            self._compute_statistics()
         return self._min
     
     @property
@@ -65,9 +114,44 @@ class ImageProperties:
         if self._img is None:
             return None
         if self._max is None:
-            self._max = np.max(self._img)
+            self._compute_statistics()
         return self._max
 
+    def display_range(self, lower: float = 0.5, upper: float = 99.5) -> tuple[Any, Any]|None:
+        """
+            Returns a robust display range (vmin, vmax) given by the lower and upper percentile, so that for example a single hot pixel does not ruin the
+            contrast. The percentiles are estimated from a deterministic strided subsample (for image stacks of at most DISPLAY_RANGE_FRAMES evenly spaced 
+            frames), which is cached. Therefore the range is available within milliseconds, also for lazy images and before the statistics are calculated
+        """
+        if self._img is None:
+            return None
+        if self._sample is None:
+            t0 = time.perf_counter()
+            self._sample = ImageProperties._subsample(self._img)
+            logger.debug(f"Sampled {self._sample.size} values for the display range in {(time.perf_counter() - t0):1.3f} s")
+        if self._sample.size == 0:
+            return None
+        vmin, vmax = np.percentile(self._sample, [lower, upper])
+        return (vmin, vmax)
+    
+    @staticmethod
+    def _subsample(img: np.ndarray|LazyImageStack) -> np.ndarray:
+        """ Returns a deterministic strided subsample of at most DISPLAY_RANGE_SAMPLES values of an image. Lazy images only read the sampled frames """
+        if len(img.shape) != 3:
+            _flat = np.asarray(img).reshape(-1)
+            return _flat[::max(1, _flat.size // ImageProperties.DISPLAY_RANGE_SAMPLES)].copy()
+        if img.shape[0] == 0:
+            return np.empty(shape=(0,), dtype=img.dtype)
+        frames, stride = ImageProperties._sample_layout(img.shape)
+        return np.stack([np.asarray(img[t])[::stride, ::stride] for t in frames]).reshape(-1)
+
+    @staticmethod
+    def _sample_layout(shape: tuple[int, ...]) -> tuple[np.ndarray, int]:
+        """ Returns the frames and the spatial stride of the display range subsample of a (non empty) image stack of the given shape """
+        frames = np.unique(np.linspace(0, shape[0] - 1, min(shape[0], ImageProperties.DISPLAY_RANGE_FRAMES)).astype(int))
+        stride = max(1, int(np.ceil(np.sqrt(len(frames)*shape[1]*shape[2] / ImageProperties.DISPLAY_RANGE_SAMPLES))))
+        return frames, stride
+
     @property
     def minClipped(self) -> np.floating|None:
         if self.min is None:
@@ -75,7 +159,7 @@ class ImageProperties:
         return np.max(np.array([0, self.min]))
     
     @property
-    def img(self) -> np.ndarray|None:
+    def img(self) -> np.ndarray|LazyImageStack|None:
         return self._img
     
     def __del__(self):
@@ -91,8 +175,9 @@ class AxisImage:
         Providing axis=(1,2) will calculate the same for each image frame.
     """
 
-    def __init__(self, img: np.ndarray|None, axis:tuple, name: str|None = None):
+    def __init__(self, img: np.ndarray|LazyImageStack|None, axis:tuple, name: str|None = None, context: "ImageFunctionContext|None" = None):
         self._img = img
+        self._context = context
         self._img_float = None
         self._axis = axis
         self._name = name
@@ -104,6 +189,7 @@ class AxisImage:
         self._median = None
         self._min = None
         self._max = None
+        self._percentiles: dict[float, ImageProperties] = {}
 
     @property
     def axis(self) -> tuple:
@@ -113,6 +199,11 @@ class AxisImage:
     def name(self) -> str|None:
         return self._name
 
+    @property
+    def context(self) -> "ImageFunctionContext|None":
+        """ When passed to an image function, provides access to the cached views of the ImageObject the function is applied on """
+        return self._context
+
     @property
     def mean_image(self) -> np.ndarray|None:
         """ Mean image over the specified axis """
@@ -148,8 +239,12 @@ class AxisImage:
         """ Maximum image over the specified axis """
         return self.max_props.img
     
+    def percentile_image(self, q: float) -> np.ndarray|None:
+        """ The q-th percentile (0 to 100) over the specified axis """
+        return self.percentile_props(q).img
+    
     @property
-    def image(self) -> np.ndarray|None:
+    def image(self) -> np.ndarray|LazyImageStack|None:
         return self._img
     
     @property
@@ -159,16 +254,45 @@ class AxisImage:
             self._props = ImageProperties(self._img)
         return self._props
 
+    def _compute_statistics(self) -> None:
+        """ Calculates all not yet cached statistics (mean, std, min and max) over the axis in a single chunked pass and caches them """
+        _missing = [op for op in STAT_OPS if getattr(self, f"_{op}") is None]
+        if self._img is None:
+            for op in _missing:
+                setattr(self, f"_{op}", ImageProperties(None))
+            return
+        t0 = time.perf_counter()
+        if len(self._img.shape) == 3:
+            r = stack_statistics(self._img, axis=self._axis, ops=_missing)
+        else:
+            _img = np.asarray(self._img)
+            r = {"mean": lambda: np.mean(_img, axis=self._axis, dtype="float32"), "std": lambda: np.std(_img, axis=self._axis, dtype="float32"),
+                 "min": lambda: np.min(_img, axis=self._axis), "max": lambda: np.max(_img, axis=self._axis)}
+            r = {op: r[op]() for op in _missing}
+        for op in _missing:
+            setattr(self, f"_{op}", ImageProperties(r[op]))
+        logger.debug(f"Calculated {', '.join(_missing)} view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+
+    def set_statistics(self, stats: dict[str, Any], dtype: Any = None) -> None:
+        """ Set already calculated statistics (e.g. from a StackStatisticsStream) if not yet cached. Min and max images are converted to the given dtype """
+        for op in (*STAT_OPS, "median"):
+            if stats.get(op, None) is None or getattr(self, f"_{op}") is not None:
+                continue
+            v = stats[op]
+            if op in ("min", "max") and dtype is not None:
+                v = np.asarray(v).astype(dtype, copy=False)
+            setattr(self, f"_{op}", ImageProperties(v))
+
+    def get_statistics(self) -> dict[str, np.ndarray]:
+        """ Returns the already calculated statistic images (mean, std, min, max and median) """
+        r = {op: getattr(self, f"_{op}").img for op in (*STAT_OPS, "median") if getattr(self, f"_{op}") is not None}
+        return {op: v for op, v in r.items() if v is not None}
+
     @property
     def mean_props(self) -> ImageProperties:
-        """ Returns the mean image properties as float image """
+        """ Returns the mean image properties as float image. Mean, std, min and max are always calculated together in a single pass """
         if self._mean is None:
-            if self._img is None:
-                self._mean = ImageProperties(None)
-            else:
-                t0 = time.perf_counter()
-                self._mean = ImageProperties(np.mean(self._img, axis=self._axis, dtype="float32"))
-                logger.debug(f"Calculated mean view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+            self._compute_statistics()
         return self._mean
     
     @property
@@ -187,19 +311,33 @@ class AxisImage:
                 self._median = ImageProperties(None)
             else:
                 t0 = time.perf_counter()
-                self._median = ImageProperties(np.median(self._img, axis=self._axis))
+                if len(self._img.shape) == 3:
+                    _median = stack_median(self._img, axis=self._axis, vmin=self.image_props.min, vmax=self.image_props.max, approximate=ImageProperties.APPROXIMATE_FLOAT_MEDIAN)
+                else:
+                    _median = np.median(self._img, axis=self._axis)
+                self._median = ImageProperties(_median)
                 logger.debug(f"Calculated median view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
         return self._median
     
+    def percentile_props(self, q: float) -> ImageProperties:
+        """ Returns the properties of the q-th percentile (0 to 100) image. Image stacks are processed chunk wise in parallel (see stack_percentile) """
+        q = float(q)
+        if q not in self._percentiles:
+            if self._img is None:
+                return ImageProperties(None)
+            t0 = time.perf_counter()
+            if len(self._img.shape) == 3:
+                _percentile = stack_percentile(self._img, q, axis=self._axis)
+            else:
+                _percentile = np.percentile(np.asarray(self._img), q, axis=self._axis)
+            self._percentiles[q] = ImageProperties(_percentile)
+            logger.debug(f"Calculated {q:g}th percentile view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+        return self._percentiles[q]
+
     @property
     def std_props(self) -> ImageProperties:
         if self._std is None:
-            if self._img is None:
-                self._std = ImageProperties(None)
-            else:
-                t0 = time.perf_counter()
-                self._std = ImageProperties(np.std(self._img, axis=self._axis, dtype="float32"))
-                logger.debug(f"Calculated std view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+            self._compute_statistics()
         return self._std
     
     @property
@@ -214,23 +352,13 @@ class AxisImage:
     @property
     def min_props(self) -> ImageProperties:
         if self._min is None:
-            if self._img is None:
-                self._min = ImageProperties(None)
-            else:
-                t0 = time.perf_counter()
-                self._min = ImageProperties(np.min(self._img, axis=self._axis))
-                logger.debug(f"Calculated minimum view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+            self._compute_statistics()
         return self._min
     
     @property
     def max_props(self) -> ImageProperties:
         if self._max is None:
-            if self._img is None:
-                self._max = ImageProperties(None)
-            else:
-                t0 = time.perf_counter()
-                self._max = ImageProperties(np.max(self._img, axis=self._axis))
-                logger.debug(f"Calculated maximum view for AxisImage '{self._name if self._name is not None else ''}' on axis '{self._axis}' in {(time.perf_counter() - t0):1.3f} s")
+            self._compute_statistics()
         return self._max
     
     # def _float_dtype(self, dtype: np.dtype) -> np.dtype:
@@ -242,12 +370,221 @@ class AxisImage:
     #             return np.dtype(np.float32)
 
 
+    def get_cached_arrays(self) -> list[np.ndarray]:
+        """ Returns all arrays hold by this AxisImage (the image itself and all already calculated derived images) """
+        _arrays = [self._img]
+        for p in [self._props, self._mean, self._mean_normed, self._std, self._std_normed, self._median, self._min, self._max, *self._percentiles.values()]:
+            if p is not None:
+                _arrays.append(p.img)
+        return [a for a in _arrays if isinstance(a, np.ndarray)]
+
     def copy(self) -> "AxisImage":
-        return AxisImage(self._img, self._axis, self._name)
+        return AxisImage(self._img, self._axis, self._name, self._context)
     
     def __del__(self):
         del self._img
 
+BlockStage = Callable[[AxisImage|None, np.ndarray|LazyImageStack], tuple[Callable[[np.ndarray], np.ndarray], int, Any]]
+""" A block stage of an image function (see get_block_stage) """
+
+_F = TypeVar("_F", bound=Callable)
+
+def set_function_metadata(fn: _F, cache_key: str|None = None, block_stage: BlockStage|None = None) -> _F:
+    """ Attaches the cache key (see get_function_key) and the block stage (see get_block_stage) to an image function and returns the function """
+    if cache_key is not None:
+        setattr(fn, "cache_key", cache_key)
+    if block_stage is not None:
+        setattr(fn, "block_stage", block_stage)
+    return fn
+
+def get_function_key(fn: Callable) -> str:
+    """
+        Returns a stable key for an image function. Functions may define the attribute cache_key (see set_function_metadata, for example a function returned by 
+        XY_DIFF_FUNCTIONS.get_gaussian_xy_kernel sets 'XY_DIFF_FUNCTIONS.gaussian_xy_kernel(sigma=2)'), so that two function objects with the same
+        parameters share their cached results. Module level functions and static methods are identified by their qualified name, all other callables
+        (for example lambdas or closures without cache_key) by their object id
+    """
+    if (key := getattr(fn, "cache_key", None)) is not None:
+        return str(key)
+    qualname = getattr(fn, "__qualname__", None)
+    if qualname is not None and "<" not in qualname and getattr(fn, "__closure__", None) is None:
+        return f"{getattr(fn, '__module__', '')}.{qualname}"
+    return f"id:{id(fn)}"
+
+def get_block_stage(fn: Callable) -> BlockStage|None:
+    """
+        Returns the block stage of an image function or None if the function can't be fused with other functions. A block stage is provided by setting 
+        the attribute 'block_stage' of the function (see set_function_metadata). It is called with the AxisImage of the image (or None for img functions) and the input stack of the 
+        function and returns a tuple (block function, halo, dtype): The block function is applied to blocks of frames and must only depend on the 
+        given number (halo) of neighbouring frames. Consecutive functions with a block stage are executed in a single chunked pass (see MappedImageStack)
+    """
+    return getattr(fn, "block_stage", None)
+
+class ImageFunctionContext:
+    """
+        Passed to image functions as AxisImage.context and provides access to the cached views of the ImageObject the function is applied on, for 
+        example to reuse the spatial mean of the image instead of recalculating it. The ImageObject is only weakly referenced
+    """
+
+    def __init__(self, imgObj: "ImageObject"):
+        self._imgObj = weakref.ref(imgObj)
+
+    @property
+    def image_object(self) -> "ImageObject|None":
+        return self._imgObj()
+
+    def img_view(self, mode: "ImageView") -> AxisImage|None:
+        """ Returns the (cached) view of the image without any image functions applied or None if the ImageObject does no longer exist """
+        if (imgObj := self._imgObj()) is None:
+            return None
+        return imgObj.img_view(mode, "default")
+
+    def img_diff_view(self, mode: "ImageView") -> AxisImage|None:
+        """ Returns the (cached) view of the delta video without any image functions applied or None if the ImageObject does no longer exist """
+        if (imgObj := self._imgObj()) is None:
+            return None
+        return imgObj.img_diff_view(mode, "default")
+
+class ViewCache:
+    """
+        A LRU cache holding the views (dict of ImageView to AxisImage) of the image functions of an ImageObject, keyed by the image type and the function
+        identifier. The views of the unmodified image and delta video are hold by the ImageObject itself and are not part of the cache. The cache
+        is limited by the bytes of all arrays hold by the cached AxisImages (the images, derived images like mean or std and normalized images). Arrays 
+        shared between AxisImages are counted once and memory mapped arrays are not counted. Pinned keys are never evicted and stable entries (for example
+        intermediate results of a function chain with the cache flag set) are only evicted after all other entries. The entries are guarded by a lock, as
+        background tasks (e.g. persisting the views to the disk cache) read the cache while the GUI thread may modify it.
+
+        :var int hits: Number of cache hits
+        :var int misses: Number of cache misses
+        :var int evictions: Number of evicted entries
+    """
+
+    _shared: "weakref.WeakValueDictionary[tuple, ViewCache]" = weakref.WeakValueDictionary()
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: collections.OrderedDict[tuple[str, str], dict["ImageView", AxisImage]] = collections.OrderedDict()
+        self._stable: set[tuple[str, str]] = set()
+        self._pins: weakref.WeakKeyDictionary[Any, set[tuple[str, str]]] = weakref.WeakKeyDictionary()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> list[tuple[str, str]]:
+        """ Returns the keys ordered from least to most recently used """
+        with self._lock:
+            return list(self._entries.keys())
+
+    def items(self) -> list[tuple[tuple[str, str], dict["ImageView", AxisImage]]]:
+        """ Returns a snapshot of the entries (with copies of the view dicts) ordered from least to most recently used without updating the LRU order """
+        with self._lock:
+            return [(k, dict(views)) for k, views in self._entries.items()]
+
+    def get(self, key: tuple[str, str]) -> dict["ImageView", AxisImage]|None:
+        """ Returns the views for the given key and marks them as recently used or None if not cached. Counts as hit or miss """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def peek(self, key: tuple[str, str]) -> dict["ImageView", AxisImage]|None:
+        """ Returns the views for the given key without updating the LRU order or the statistics """
+        with self._lock:
+            return self._entries.get(key, None)
+
+    def put(self, key: tuple[str, str], views: dict["ImageView", AxisImage], stable: bool = False) -> None:
+        """ Add or replace the views for a key. Stable entries are evicted last """
+        with self._lock:
+            self._entries[key] = views
+            self._entries.move_to_end(key)
+            if stable:
+                self._stable.add(key)
+            else:
+                self._stable.discard(key)
+
+    def remove(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stable.discard(key)
+
+    @staticmethod
+    def _array_root(a: np.ndarray) -> np.ndarray:
+        """ Returns the array owning the memory of a (possible) numpy view """
+        while isinstance(a.base, np.ndarray):
+            a = a.base
+        return a
+
+    def _unique_arrays(self, keys: list[tuple[str, str]]) -> dict[int, int]:
+        """ Returns a dict mapping the id of every array owning memory used by the given entries to its size in bytes """
+        r: dict[int, int] = {}
+        with self._lock:
+            _views = [list(self._entries[k].values()) for k in keys if k in self._entries]
+        for _entry in _views:
+            for axis_img in _entry:
+                for a in axis_img.get_cached_arrays():
+                    a = ViewCache._array_root(a)
+                    if not isinstance(a, np.memmap):
+                        r[id(a)] = a.nbytes
+        return r
+
+    @property
+    def nbytes(self) -> int:
+        """ The total size of all cached arrays in bytes """
+        return sum(self._unique_arrays(self.keys()).values())
+
+    def entry_nbytes(self, key: tuple[str, str]) -> int:
+        """ The size of the arrays hold by the given entry, which are not shared with any other entry """
+        _others = self._unique_arrays([k for k in self.keys() if k != key])
+        return sum(v for k, v in self._unique_arrays([key]).items() if k not in _others)
+
+    def pin(self, owner: Any, keys: set[tuple[str, str]]) -> None:
+        """ Replace the keys pinned by the given owner (for example the ImageObject using this cache). The pins are released when the owner is garbage collected """
+        self._pins[owner] = keys
+
+    def evict(self, pinned: set[tuple[str, str]]|None = None, full_clear: bool = False) -> int:
+        """ Evicts entries (least recently used and not stable first) until the cache fits into max_bytes or (full_clear) all unpinned entries are removed. Returns the number of evicted entries """
+        with self._lock:
+            pinned = set().union(pinned or set(), *self._pins.values())
+            _candidates = [k for k in self.keys() if k not in pinned and k not in self._stable] + [k for k in self.keys() if k not in pinned and k in self._stable]
+            count = 0
+            for k in _candidates:
+                if not full_clear and self.nbytes <= self.max_bytes:
+                    break
+                self.remove(k)
+                count += 1
+            self.evictions += count
+            return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stable.clear()
+
+    @classmethod
+    def shared(cls, identity: tuple, max_bytes: int) -> "ViewCache":
+        """ Returns the cache shared by all ImageObjects with the same identity (for example the same file). The cache lives as long as it is used by an ImageObject """
+        cache = cls._shared.get(identity, None)
+        if cache is None:
+            cache = cls(max_bytes=max_bytes)
+            cls._shared[identity] = cache
+        cache.max_bytes = max(cache.max_bytes, max_bytes)
+        return cache
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """ Returns the cache statistics (hits, misses, evictions, entries, nbytes and max_bytes) """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries), "nbytes": self.nbytes, "max_bytes": self.max_bytes}
+
 class FunctionType(Enum):
     """ A simple wrapper to encode the type of a image function with an priority """
 
@@ -256,6 +593,60 @@ class FunctionType(Enum):
     T = 10
 
 
+class ImageProbe:
+    """
+        Describes an image file without reading its image data (see ImageObject.probe())
+
+        :var Path path: The path of the file
+        :var tuple shape: The shape of the image as stored in the file, i.e. (t, y, x) or (t, y, x, c) for colored images
+        :var np.dtype dtype: The dtype of the image
+        :var dict|None metadata: The metadata of the file
+        :var str reader: The library used to read the file ('tifffile', 'nd2' or 'pims')
+    """
+
+    def __init__(self, path: Path, shape: tuple[int, ...], dtype: Any, metadata: dict|None, reader: Literal["tifffile", "nd2", "pims"]):
+        self.path = path
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.metadata = metadata
+        self.reader = reader
+
+    @property
+    def frames(self) -> int:
+        """ The number of frames """
+        return self.shape[0]
+
+    @property
+    def colored(self) -> bool:
+        """ True if the image has more than one color channel """
+        return len(self.shape) == 4 and self.shape[3] > 1
+
+    @property
+    def nbytes(self) -> int:
+        """ The size of the (grey scaled) image in bytes when loaded into memory """
+        return int(np.prod(self.shape[:3]))*self.dtype.itemsize
+
+    def estimate_peak_bytes(self, precompute: bool = True, lazy: bool = False) -> int:
+        """ 
+            Estimates the peak memory usage in bytes for opening the file with ImageObject.open_file(). The estimate assumes, that the values of unsigned
+            images use the full range of their dtype
+
+            :param bool precompute: Include the precomputation of the views (and therefore the delta video)
+            :param bool lazy: The file is opened lazily, i.e. the image itself is not held in memory
+        """
+        lazy = lazy and self.reader in ["tifffile", "nd2"]
+        r = 0 if lazy else self.nbytes
+        if self.colored and not lazy:
+            r += int(np.prod(self.shape))*self.dtype.itemsize # The colored image (the grey scale conversion is done chunk wise)
+        if precompute and not (lazy or UserSettings.IMAGE_LOADING.lazy_delta.get()):
+            r += self.nbytes*(2 if self.dtype.kind == "u" and self.dtype.itemsize < 8 else 1) # The delta video in a signed dtype
+        if precompute:
+            r += 16*4*int(np.prod(self.shape[1:3])) # The derived float32 images (e.g. mean and std)
+        return r
+
+    def __repr__(self) -> str:
+        return f"<ImageProbe '{self.path.name}' shape={self.shape} dtype={self.dtype} nbytes={self.nbytes}>"
+
 class ImageObject(Serializable):
     """
         A class for holding a) the image provided in form an three dimensional numpy array (time, y, x) and b) the derived images and properties, for example
@@ -263,28 +654,48 @@ class ImageObject(Serializable):
     """
 
     SUPPORTED_EXPORT_EXTENSIONS = [("Lossless compressed Tiff", ("*.tiff", "*.tif"))] 
+
+    _pending_views: list[tuple[str, dict[str, dict[str, np.ndarray]]]] = []
+    """ Views collected when clearing an ImageObject, which are not yet written to the disk cache. Shared by all ImageObjects, as usually a new ImageObject is created for the next file """
+    _pending_lock = threading.Lock()
     
-    def __init__(self, conv_cache_size: int = 1, diff_conv_cache_size: int = 3):
+    def __init__(self, cache_bytes: int|None = None):
+        """
+            :param int|None cache_bytes: Maximum size in bytes of the cached views (see ViewCache). Defaults to the setting PERFORMANCE.view_cache_mb or,
+                if set to zero, to a quarter of the total RAM
+        """
         global SignalObject
         from .signal_detection import SignalObject
         self._task_open_image = Task(lambda task, **kwargs: None, "ImageObject", run_async=True, keep_alive=False)
-        self.conv_cache_size = conv_cache_size
-        self.diff_conv_cache_size = diff_conv_cache_size
+        if cache_bytes is None:
+            cache_bytes = UserSettings.PERFORMANCE.view_cache_mb.get()*1024**2
+            if cache_bytes <= 0:
+                cache_bytes = psutil.virtual_memory().total // 4
+        self._views = ViewCache(max_bytes=cache_bytes)
         self.clear()
 
     def clear(self):
         """ Resets the ImageObject and clears all stored images and metadata """
+        # The views are only collected here and written to the disk cache by the next background task (see write_pending_views)
+        if getattr(self, "_fingerprint", None) is not None and len(_entries := self._collect_views()) > 0:
+            with ImageObject._pending_lock:
+                ImageObject._pending_views.append((cast(str, self._fingerprint), _entries))
+        self._fingerprint: str|None = None
+        self._disk_entries: dict[str, dict[str, np.ndarray]|None] = {}
+        self._persistent_ids: set[tuple[str, str]] = {("img", "default"), ("img_diff", "default")}
         self._name: str|None = None
         self._name_without_extension: str|None = None
         self._path: Path|None = None
         self._metadata: dict|None = None
 
         self._img: np.ndarray|None = None
-        self._img_views: dict[str, dict[ImageView|None, AxisImage]] = {"default" : {}}
         self._img_functions: list[tuple[str, Callable[[AxisImage], AxisImage], bool, FunctionType|int]] = []
 
         self._img_diff: np.ndarray|None = None
-        self._img_diff_views: dict[str, dict[ImageView|None, AxisImage]] = {"default" : {}}
+        self._views = ViewCache(max_bytes=self._views.max_bytes)
+        self._share_identity: tuple|None = None
+        self._default_views: dict[str, dict[ImageView, AxisImage]] = {"img": {}, "img_diff": {}}
+        self._context = ImageFunctionContext(self)
         self._img_diff_functions: list[tuple[str, Callable[[AxisImage, AxisImage], AxisImage], bool, FunctionType|int]] = []
 
         self.img_size: int|None = None
@@ -345,53 +756,56 @@ class ImageObject(Serializable):
     # Img and ImageDiff properties
 
     @property
-    def img(self) -> np.ndarray | None:
+    def img(self) -> np.ndarray|LazyImageStack|None:
         """
-            Get or set the image. Note that setting to a new value will remove the old diff image
+            Get or set the image. Note that setting to a new value will remove the old diff image. Images with a maximum of at most 1 are scaled by 255. 
+            Lazy images (memory mapped arrays or a LazyImageStack) are not loaded into memory and keep their dtype. Therefore only lazy float images are
+            scaled (frame wise on demand)
 
             :raises UnsupportedImageError: The image is not a valid image stack
         """
         return self.img_view(ImageView.DEFAULT).image
     
     @img.setter
-    def img(self, image: np.ndarray):
+    def img(self, image: np.ndarray|LazyImageStack):
         if not ImageObject._is_valid_image_stack(image): raise UnsupportedImageError()
         self.clear()
-        _max = np.max(image)
-        if _max <= 1:
-            image = 255*image
-            _max = 255*_max
-        if not (np.issubdtype(image.dtype, np.integer) or np.issubdtype(image.dtype, np.floating)):
-            raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
-            
-        if np.issubdtype(image.dtype, np.integer):
-            if _max < 2**8:
-                image = image.astype(np.uint8) if image.dtype != np.uint8 else image
-            elif _max < 2**16:
-                image = image.astype(np.uint16) if image.dtype != np.uint16 else image
-            elif _max < 2**32:
-                image = image.astype(np.uint32) if image.dtype != np.uint32 else image
-            elif _max < 2**63: # Here 2**63 to support also the signed datatype
-                image = image.astype(np.uint64) if image.dtype != np.uint64 else image
-            else:
+        if is_lazy(image):
+            # Lazy images keep their dtype, as converting them would load the whole stack into memory
+            if not (np.issubdtype(image.dtype, np.integer) or np.issubdtype(image.dtype, np.floating)):
                 raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
-
+            if image.dtype.kind == "f":
+                # Like for images in memory, float images with a maximum of at most 1 are scaled by 255 (frame wise on demand). The minimum and maximum
+                # are needed anyway (e.g. for the dtype of the delta video) and therefore cached
+                _stats = stack_statistics(image, axis=None, ops=("min", "max"))
+                if _stats["max"] <= 1:
+                    logger.debug(f"Scaling the lazy float image by 255, as its maximum is {_stats['max']}")
+                    image = MappedImageStack(image, lambda block: np.multiply(block, 255, dtype=block.dtype), dtype=image.dtype)
+                    _stats = {op: 255*v for op, v in _stats.items()}
+            self._img = image
+            self.img_size = image.nbytes
+            if image.dtype.kind == "f":
+                self.img_props.set_statistics(_stats, dtype=image.dtype)
+            return
+        image, _min, _max = ImageObject._narrow_image(image, signed=False)
         self._img = image
         self.img_size = self._img.nbytes
+        self.img_props.set_statistics({"min": _min, "max": _max}, dtype=image.dtype)
         
     @property
-    def img_raw(self) -> np.ndarray|None:
+    def img_raw(self) -> np.ndarray|LazyImageStack|None:
         """ Returns the image without any convolutions applied """
         return self._img
 
     @img_raw.setter
-    def img_raw(self, image: np.ndarray):
+    def img_raw(self, image: np.ndarray|LazyImageStack):
         self.img = image
     
     @property
-    def img_diff(self) -> np.ndarray | None:
+    def img_diff(self) -> np.ndarray|LazyImageStack|None:
         """ 
-            Get or set the diff image. Note that setting to a new value will remove the old image
+            Get or set the diff image. Note that setting to a new value will remove the old image. For lazy images (or if the setting 
+            IMAGE_LOADING.lazy_delta is set), the diff image is a DeltaImageStack calculating the frames on demand
 
             :raises UnsupportedImageError: The image is not a valid image stack
         """
@@ -401,30 +815,18 @@ class ImageObject(Serializable):
     def img_diff(self, image: np.ndarray):
         if not ImageObject._is_valid_image_stack(image): raise UnsupportedImageError()
         self.clear()
-        _max = np.max(image)
-        if _max <= 1:
-            image = 255*image
-            _max = 255*_max
-        if not (np.issubdtype(image.dtype, np.integer) or np.issubdtype(image.dtype, np.floating)):
-            raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
-            
-        if np.issubdtype(image.dtype, np.integer):
-            if _max < 2**7:
-                image = image.astype(np.int8)
-            elif _max < 2**15:
-                image = image.astype(np.int16)
-            elif _max < 2**31:
-                image = image.astype(np.int32)
-            elif _max < 2**63:
-                image = image.astype(np.int64)
-            else:
-                raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
-        
+        image, _min, _max = ImageObject._narrow_image(image, signed=True)
         self._img_diff = image
+        self.img_diff_props.set_statistics({"min": _min, "max": _max}, dtype=image.dtype)
         
     @property
-    def img_diff_raw(self) -> np.ndarray | None:
-        if self._img_diff is None and (_img_signed := self.img_signed) is not None:
+    def img_diff_raw(self) -> np.ndarray|LazyImageStack|None:
+        if self._img_diff is None and self._img is not None and (is_lazy(self._img) or UserSettings.IMAGE_LOADING.lazy_delta.get()):
+            if (_max := self.img_props.max) is None:
+                return None
+            self._img_diff = DeltaImageStack(self._img, ImageObject._signed_dtype(self._img.dtype, _max))
+            logger.debug(f"Providing the delta video of '{self.name}' on demand")
+        elif self._img_diff is None and (_img_signed := self.img_signed) is not None:
             t0 = time.perf_counter()
             self._img_diff = np.diff(_img_signed, axis=0)
             t1 = time.perf_counter()
@@ -438,19 +840,14 @@ class ImageObject(Serializable):
     @property
     def img_signed(self) -> np.ndarray | None:
         """
-            Returns a numpy view with a signed datatype (e.g. for calculating the diffImage). 
+            Returns a numpy view with a signed datatype (e.g. for calculating the diffImage). Returns None for lazy images, as they would need to be loaded into memory
         """
-        if self._img is None or (_max := self.img_props.max) is None:
+        if self._img is None or isinstance(self._img, LazyImageStack) or (_max := self.img_props.max) is None:
             return None
         if self._img.dtype.kind in ("i", "f"):
             return self._img
-        if _max < 2**7:
-            return self._img.view("int8") if self._img.dtype == np.uint8 else self._img.astype("int8")
-        elif _max < 2**15:
-            return self._img.view("int16") if self._img.dtype == np.uint16 else self._img.astype("int16")
-        elif _max < 2**31:
-            return self._img.view("int32") if self._img.dtype == np.uint32 else self._img.astype("int32")
-        return self._img.view("int64")  if self._img.dtype == np.uint64 else self._img.astype("int64")
+        dtype = ImageObject._signed_dtype(self._img.dtype, _max)
+        return self._img.view(dtype) if dtype.itemsize == self._img.dtype.itemsize else self._img.astype(dtype)
 
     # ImageProperties
     
@@ -465,101 +862,144 @@ class ImageObject(Serializable):
         return self.img_diff_view(ImageView.DEFAULT).image_props
     
     def img_frame_props(self, frame:int) -> ImageProperties:
-        """ Returns the image properties for a given frame """
-        # Edge case, do not use caching
+        """ Returns the image properties for a given frame. Min, max, mean and std are looked up in the per frame statistics table """
         if self.img is None or frame < 0 or frame >= self.img.shape[0]:
             return ImageProperties(None)
-        return ImageProperties(self.img[frame])
+        return ImageObject._frame_props(self.img, self.img_view(ImageView.TEMPORAL), frame)
     
     def img_diff_frame_props(self, frame:int) -> ImageProperties:
-        """ Returns the image diff properties for a given frame """
-        # Edge case, do not use caching
+        """ Returns the image diff properties for a given frame. Min, max, mean and std are looked up in the per frame statistics table """
         if self.img_diff is None or frame < 0 or frame >= self.img_diff.shape[0]:
             return ImageProperties(None)
-        return ImageProperties(self.img_diff[frame])
+        return ImageObject._frame_props(self.img_diff, self.img_diff_view(ImageView.TEMPORAL), frame)
+    
+    def frame_statistics(self, img_type: Literal["img", "img_diff"] = "img", percentiles: tuple[float, ...] = ()) -> dict[str, np.ndarray]|None:
+        """
+            Returns the per frame statistics table of the image (or the delta video), i.e. vectors with the min, max, mean and std of every frame. The
+            table is the TEMPORAL view of the current image and therefore filled in the same pass (e.g. while opening the file or in precompute_image) 
+            and cached with it. Lookups for single frames are O(1)
+
+            :param tuple[float, ...] percentiles: Also return the given per frame percentiles (0 to 100) with the key 'p{q}' (e.g. 'p99.5')
+        """
+        view = self.img_view(ImageView.TEMPORAL) if img_type == "img" else self.img_diff_view(ImageView.TEMPORAL)
+        if view.image is None:
+            return None
+        view.mean_props # Calculates all missing statistics in a single pass
+        r = view.get_statistics()
+        for q in percentiles:
+            r[f"p{q:g}"] = view.percentile_image(q)
+        return r
+    
+    @staticmethod
+    def _frame_props(img: np.ndarray|LazyImageStack, view: AxisImage, frame: int) -> ImageProperties:
+        """ Returns the properties of a frame seeded with the statistics of the frame from the per frame statistics table (the TEMPORAL view) """
+        _stats = view.get_statistics()
+        if not all(op in _stats for op in STAT_OPS) and not is_lazy(img):
+            view.mean_props # Calculating the table once is cheaper than a pass over the frame for every lookup. Lazy images must not read the whole file
+            _stats = view.get_statistics()
+        props = ImageProperties(img[frame])
+        props.set_statistics({op: v[frame] for op, v in _stats.items()}, dtype=img.dtype)
+        return props
     
     # Image View
 
     def img_view(self, mode: "ImageView", fn_list: list[tuple[str, Callable[[AxisImage], AxisImage], bool, FunctionType|int]]|Literal["default"]|None = None, cache: bool = True) -> AxisImage:
         """ Returns a view of the current image given an ImageView mode """
-        if ImageView.DEFAULT not in self._img_views:
-            self._img_views["default"][ImageView.DEFAULT] = AxisImage(self.img_raw, axis=ImageView.DEFAULT.value, name=f"{self.name}-img")
-
         if fn_list is None:
             fn_list = self._img_functions
         elif fn_list == "default":
             fn_list = []
-        id = self.get_functions_identifier(fn_list)
-
-        if id not in self._img_views.keys():
-            logger.debug(f"Calculating img function for identifier '{id}' on '{self.name}'")
-            fn_img = self._img_views["default"][ImageView.DEFAULT]
-            for i, (name, fn, cache_fn, priority) in enumerate(fn_list):
-                fn_id = self.get_functions_identifier(fn_list[:i+1])
-                fn_hash = "@" + fn_id.split("@")[1] if "@" in fn_id else ""
-                fn_img = fn(fn_img)
-                fn_img._name = f"{self.name}-{name}{fn_hash}-img"
-
-                if cache_fn and fn_id not in self._img_views:
-                    self._img_views[fn_id] = {ImageView.DEFAULT: fn_img}
-
-            if cache:
-                self._img_views[id] = {ImageView.DEFAULT: fn_img}
-        else:
-            fn_img = self._img_views[id][ImageView.DEFAULT]
-
-        if mode not in self._img_views[id].keys():
-            axis_image = AxisImage(fn_img.image, axis=mode.value, name=fn_img._name)
-            if cache:
-                self._img_views[id][mode] = axis_image
-        else:
-            axis_image = self._img_views[id][mode]
-
-        self.clear_cache()
-        
-        return axis_image
+        return self._get_view("img", mode, fn_list, cache)
         
-    
     def img_diff_view(self, mode: "ImageView", fn_list: list[tuple[str, Callable[[AxisImage, AxisImage], AxisImage], bool, FunctionType|int]]|Literal["default"]|None = None, cache: bool = True) -> AxisImage:
         """ Returns a view of the current image given an ImageView mode """
-        if ImageView.DEFAULT not in self._img_diff_views:
-            self._img_diff_views["default"][ImageView.DEFAULT] = AxisImage(self.img_diff_raw, axis=ImageView.DEFAULT.value, name=f"{self.name}-img_diff")
-
         if fn_list is None:
             fn_list = self._img_diff_functions
         elif fn_list == "default":
             fn_list = []
-        id = self.get_functions_identifier(fn_list)
+        return self._get_view("img_diff", mode, fn_list, cache)
 
-        if id not in self._img_diff_views.keys():
-            logger.debug(f"Calculating img_diff function for identifier '{id}' on '{self.name}'")
-            fn_img = self._img_diff_views["default"][ImageView.DEFAULT]
-            img = self.img_view(ImageView.DEFAULT, "default")
-            for i, (name, fn, cache_fn, priority) in enumerate(fn_list):
-                fn_id = self.get_functions_identifier(fn_list[:i+1])
-                fn_hash = "@" + fn_id.split("@")[1] if "@" in fn_id else ""
-                fn_img = fn(img, fn_img)
-                fn_img._name = f"{self.name}-{name}{fn_hash}-img_diff"
-
-                if cache_fn and fn_id not in self._img_diff_views:
-                    self._img_diff_views[fn_id] = {ImageView.DEFAULT: fn_img}
+    def _get_view(self, img_type: Literal["img", "img_diff"], mode: "ImageView", fn_list: list[tuple[str, Callable[..., AxisImage], bool, FunctionType|int]], cache: bool) -> AxisImage:
+        """ Internal function to retrieve a view of the img or img_diff with the given function list applied from the cache or calculate it """
+        _default_views = self._default_views[img_type]
+        if ImageView.DEFAULT not in _default_views:
+            _default_views[ImageView.DEFAULT] = AxisImage((self.img_raw if img_type == "img" else self.img_diff_raw), axis=ImageView.DEFAULT.value, name=f"{self.name}-{img_type}", 
+                                                          context=self._context)
+            self._seed_from_disk(img_type, "default", ImageView.DEFAULT, _default_views[ImageView.DEFAULT])
 
+        id = self.get_functions_identifier(fn_list)
+        views = _default_views if id == "default" else self._views.get((img_type, id))
+
+        if views is None:
+            logger.debug(f"Calculating {img_type} function for identifier '{id}' on '{self.name}'")
+            fn_img = _default_views[ImageView.DEFAULT]
+            img = self.img_view(ImageView.DEFAULT, "default") if img_type == "img_diff" else None
+            # Continue from the longest already cached prefix of the function chain
+            start = 0
+            for i in range(len(fn_list) - 1, 0, -1):
+                if (_prefix_views := self._views.peek((img_type, self.get_functions_identifier(fn_list[:i])))) is not None and ImageView.DEFAULT in _prefix_views:
+                    fn_img, start = _prefix_views[ImageView.DEFAULT], i
+                    logger.debug(f"Reusing the cached result for the first {i} function(s)")
+                    break
+            i = start
+            while i < len(fn_list):
+                # Consecutive functions providing a block stage are fused into one pass, as long as their intermediate results need not to be cached
+                j = i
+                while get_block_stage(fn_list[j][1]) is not None and not fn_list[j][2] and j + 1 < len(fn_list) and get_block_stage(fn_list[j+1][1]) is not None:
+                    j += 1
+                name, fn, cache_fn, priority = fn_list[j]
+                fn_id = self.get_functions_identifier(fn_list[:j+1])
+                fn_hash = "@" + fn_id.split("@")[1] if "@" in fn_id else ""
+                fn_img._context = self._context
+                if j > i:
+                    fn_img = self._apply_fused(img, fn_img, fn_list[i:(j+1)])
+                else:
+                    fn_img = fn(fn_img) if img_type == "img" else fn(img, fn_img)
+                fn_img._name = f"{self.name}-{name}{fn_hash}-{img_type}"
+
+                if cache_fn and (img_type, fn_id) not in self._views:
+                    self._views.put((img_type, fn_id), {ImageView.DEFAULT: fn_img}, stable=True)
+                i = j + 1
+
+            views = {ImageView.DEFAULT: fn_img}
+            if all(not get_function_key(fn).startswith("id:") for name, fn, cache_fn, priority in fn_list):
+                self._persistent_ids.add((img_type, id))
+            self._seed_from_disk(img_type, id, ImageView.DEFAULT, fn_img)
             if cache:
-                self._img_diff_views[id] = {ImageView.DEFAULT: fn_img}
+                self._views.put((img_type, id), views)
         else:
-            fn_img = self._img_diff_views[id][ImageView.DEFAULT]
+            fn_img = views[ImageView.DEFAULT]
 
-        if mode not in self._img_diff_views[id].keys():
+        if mode not in views.keys():
             axis_image = AxisImage(fn_img.image, axis=mode.value, name=fn_img._name)
+            self._seed_from_disk(img_type, id, mode, axis_image)
             if cache:
-                self._img_diff_views[id][mode] = axis_image
+                views[mode] = axis_image
         else:
-            axis_image = self._img_diff_views[id][mode]
+            axis_image = views[mode]
 
         self.clear_cache()
         
         return axis_image
     
+    def _apply_fused(self, img: AxisImage|None, fn_img: AxisImage, fn_list: list[tuple[str, Callable[..., AxisImage], bool, FunctionType|int]]) -> AxisImage:
+        """
+            Applies consecutive image functions providing a block stage (see get_block_stage) in a single chunked pass: Spatial stages are applied per block
+            of frames and temporal stages read the neighbouring frames (halo) additionally. No intermediate full size images are created. For lazy images 
+            the result is provided on demand, otherwise it is calculated in parallel into a single output array
+        """
+        if fn_img.image is None:
+            return fn_img.copy()
+        t0 = time.perf_counter()
+        stack = fn_img.image
+        for name, fn, cache_fn, priority in fn_list:
+            block_fn, halo, dtype = cast(Callable, get_block_stage(fn))(img, stack)
+            stack = MappedImageStack(stack, block_fn, dtype=dtype, halo=halo)
+        if not is_lazy(fn_img.image):
+            stack = materialize(stack, chunk_size=frames_per_chunk(stack, chunk_bytes=STAT_CHUNK_ELEMENTS*stack.dtype.itemsize))
+        logger.debug(f"Applied the fused functions {', '.join([name for name, fn, cache_fn, priority in fn_list])} in {(time.perf_counter()-t0):1.3f} s")
+        return AxisImage(stack, axis=fn_img.axis, name=fn_img.name, context=self._context)
+
     # Signal
 
     @property
@@ -594,35 +1034,189 @@ class ImageObject(Serializable):
         self.signal_obj.clear()
 
     def get_functions_identifier(self, functions: list[tuple[str, Callable[..., AxisImage], bool, FunctionType|int]]) -> str:
+        """ 
+            Returns the cache identifier for a list of image functions. The identifier is build from the function names and the keys of the functions 
+            (see get_function_key), so that identical function chains and identical prefixes of function chains share the same cache entries
+        """
         if len(functions) == 0:
             return "default"
-        return "-".join([name for name, fn, cache, priority in functions]) + (hex(hash("".join([str(id(fn)) for name, fn, cache, priority in functions]))).replace("0x", "@") if len(functions) > 0 else "")
+        _digest = hashlib.sha1("|".join([get_function_key(fn) for name, fn, cache, priority in functions]).encode()).hexdigest()[:16]
+        return "-".join([name for name, fn, cache, priority in functions]) + "@" + _digest
 
     def sort_functions(self) -> None:
         self._img_functions.sort(key=lambda v: v[3].value if isinstance(v[3], FunctionType) else v[3], reverse=True)
         self._img_diff_functions.sort(key=lambda v: v[3].value if isinstance(v[3], FunctionType) else v[3], reverse=True)
 
-    def clear_cache(self, full_clear: bool = False) -> None:
-        """Clears caches of unsused convolutions """
-        gc_count = 0
-        fn_id = self.get_functions_identifier(self._img_functions)
-        for k in list(self._img_views.keys()):
-            if not full_clear and len(self._img_views) <= self.conv_cache_size:
-                break
-            if k != "default" and k != fn_id:
-                del self._img_views[k]
-                gc_count += 1
-
-        fn_diff_id = self.get_functions_identifier(self._img_diff_functions)   
-        for k in list(self._img_diff_views.keys()):
-            if not full_clear and len(self._img_diff_views) <= self.diff_conv_cache_size:
-                break
-            if k != "default" and k != fn_diff_id:
-                del self._img_diff_views[k]
-                gc_count += 1
+    # Disk cache
+
+    def load_cached_arrays(self, key: str) -> dict[str, np.ndarray]|None:
+        """ Returns the arrays stored in the disk cache for this file under the given key or None if not available (see disk_cache) """
+        if self._fingerprint is None:
+            return None
+        if key not in self._disk_entries:
+            self._disk_entries[key] = disk_cache.load(self._fingerprint, key)
+        return self._disk_entries[key]
+
+    def store_cached_arrays(self, key: str, arrays: dict[str, np.ndarray]) -> None:
+        """ Stores the given arrays in the disk cache for this file under the given key. Has no effect if the ImageObject does not originate from a file """
+        if self._fingerprint is None:
+            return
+        disk_cache.store(self._fingerprint, key, arrays)
+        self._disk_entries.pop(key, None)
+
+    def is_persistent(self, fn_list: list[tuple[str, Callable[..., AxisImage], bool, FunctionType|int]]) -> bool:
+        """ Returns True if results for the given function list can be stored in the disk cache, i.e. all functions have a stable key (see get_function_key) """
+        return self._fingerprint is not None and all(not get_function_key(fn).startswith("id:") for name, fn, cache, priority in fn_list)
+
+    def _seed_from_disk(self, img_type: Literal["img", "img_diff"], id: str, mode: "ImageView", axis_image: AxisImage) -> None:
+        """ Set the statistics of a newly created view from the disk cache if available """
+        if (img_type, id) not in self._persistent_ids or axis_image.image is None:
+            return
+        if (entry := self.load_cached_arrays(f"{img_type}:{id}")) is None:
+            return
+        stats = {k.split(".")[1]: v for k, v in entry.items() if k.split(".")[0] == mode.name}
+        if mode == ImageView.DEFAULT:
+            axis_image.image_props.set_statistics({k: v[()] for k, v in stats.items()})
+        else:
+            axis_image.set_statistics(stats)
+
+    def persist_views(self) -> None:
+        """ 
+            Stores the already calculated statistics of the views (e.g. the spatial mean or the temporal maximum, but not the 3D images) in the disk cache.
+            Also writes the views collected from previously opened images (see write_pending_views). As this writes to disk, it should be called from
+            a background task
+        """
+        self.write_pending_views()
+        if self._fingerprint is None:
+            return
+        t0 = time.perf_counter()
+        for key, arrays in self._collect_views().items():
+            self.store_cached_arrays(key, arrays)
+        logger.debug(f"Persisted the views of '{self.name}' in {(time.perf_counter()-t0):1.3f} s")
+
+    def write_pending_views(self) -> None:
+        """ Writes the views collected when clearing an ImageObject (e.g. when opening a new file) to the disk cache """
+        while True:
+            with ImageObject._pending_lock:
+                if len(ImageObject._pending_views) == 0:
+                    break
+                fingerprint, entries = ImageObject._pending_views.pop(0)
+            t0 = time.perf_counter()
+            for key, arrays in entries.items():
+                disk_cache.store(fingerprint, key, arrays)
+            logger.debug(f"Persisted the views of a previous image in {(time.perf_counter()-t0):1.3f} s")
+
+    def _collect_views(self) -> dict[str, dict[str, np.ndarray]]:
+        """ Returns the already calculated statistics of all persistent views as arrays per disk cache key (e.g. 'img:default' -> 'SPATIAL.mean') """
+        r: dict[str, dict[str, np.ndarray]] = {}
+        for img_type in ["img", "img_diff"]:
+            # Work on snapshots, as this may run in a background task while the GUI thread adds or evicts views
+            _entries = [("default", dict(self._default_views[img_type]))] + [(k[1], views) for k, views in self._views.items() if k[0] == img_type]
+            for id, views in _entries:
+                if (img_type, id) not in self._persistent_ids:
+                    continue
+                arrays: dict[str, np.ndarray] = {}
+                for mode, axis_image in views.items():
+                    if mode == ImageView.DEFAULT:
+                        _stats = axis_image.image_props.get_statistics() if axis_image._props is not None else {}
+                    else:
+                        _stats = axis_image.get_statistics()
+                    arrays.update({f"{mode.name}.{op}": np.asarray(v) for op, v in _stats.items()})
+                if len(arrays) > 0:
+                    r[f"{img_type}:{id}"] = arrays
+        return r
 
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        """ Returns the statistics of the view cache (hits, misses, evictions, entries, nbytes and max_bytes) """
+        return self._views.stats
+
+    def clear_cache(self, full_clear: bool = False) -> None:
+        """ Evicts cached convolutions until the cache fits into its byte budget. If full_clear is set, all unsused convolutions are removed """
+        self._views.pin(self, {("img", self.get_functions_identifier(self._img_functions)), ("img_diff", self.get_functions_identifier(self._img_diff_functions))})
+        gc_count = self._views.evict(full_clear=full_clear)
         if gc_count > 0:
-            logger.debug(f"Garbage collect {gc_count} convolutions")
+            logger.debug(f"Garbage collect {gc_count} convolutions (cache size now {self._views.nbytes/1024**2:1.1f} MB)")
+
+    def _share_views(self, identity: tuple) -> None:
+        """ Replace the view cache by the cache shared with all other ImageObjects of the same identity (e.g. the same file) """
+        shared = ViewCache.shared(identity, max_bytes=self._views.max_bytes)
+        for key in self._views.keys():
+            if key not in shared:
+                shared.put(key, cast(dict, self._views.peek(key)))
+        self._views = shared
+        self._share_identity = identity
+
+    # Sub views
+
+    def sub_view(self, frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> "ImageObject":
+        """
+            Returns a new ImageObject providing only the given frames and spatial region of this ImageObject without copying the image: In memory and memory
+            mapped images are sliced (numpy views), lazy images are wrapped into a SubImageStack. For a contiguous frame range, the delta video is sliced
+            as well. Statistics already calculated by this ImageObject are reused where possible: The per frame statistics if the whole field of view is 
+            selected and the per pixel statistics if all frames are selected. Sub views with the same selection of the same file share their view cache
+
+            :param slice|None frames: The frames to select (start, stop and step), e.g. slice(1000, 3000)
+            :param tuple[slice, slice]|None crop: The spatial region (y, x) to select, e.g. (slice(0, 256), slice(256, 512))
+            :raises NoImageError: This ImageObject has no image
+            :raises ValueError: The selection is empty
+        """
+        if self._img is None:
+            raise NoImageError()
+        frame_indices, crop, shape = subset_indices(self._img.shape, frames, crop)
+        frames = slice(frame_indices.start, (frame_indices.stop if frame_indices.stop >= 0 else None), frame_indices.step)
+        full_frames, full_fov = len(frame_indices) == self._img.shape[0] and frame_indices.step == 1, shape[1:3] == self._img.shape[1:3]
+
+        sub = ImageObject(cache_bytes=self._views.max_bytes)
+        if isinstance(self._img, LazyImageStack):
+            sub._img = SubImageStack(self._img, frames, crop)
+        else:
+            sub._img = self._img[frames, crop[0], crop[1]]
+        sub.img_size = sub._img.nbytes
+        _diff_frames = None
+        if frame_indices.step == 1 and self._img_diff is not None and len(frame_indices) > 1:
+            _diff_frames = slice(frame_indices.start, frame_indices[-1])
+            if isinstance(self._img_diff, DeltaImageStack):
+                sub._img_diff = DeltaImageStack(sub._img, self._img_diff.dtype, sign=self._img_diff._sign) # Reuse the dtype, as the maximum of the sub view may be unknown
+            elif isinstance(self._img_diff, LazyImageStack):
+                sub._img_diff = SubImageStack(self._img_diff, _diff_frames, crop)
+            else:
+                sub._img_diff = self._img_diff[_diff_frames, crop[0], crop[1]]
+
+        sub._metadata = self._metadata
+        sub._path = self._path
+        sub.name = self.name
+        sub.name_without_extension = f"{self.name_without_extension}_sub" if self.name_without_extension is not None else None
+        if self._share_identity is not None:
+            sub._share_views((*self._share_identity, "sub", repr(frames), repr(crop)))
+
+        for img_type, _frames in [("img", frames), ("img_diff", _diff_frames)]:
+            if img_type == "img_diff" and sub._img_diff is None:
+                continue
+            _parent_views, _sub_views = self._default_views[img_type], sub._default_views[img_type]
+            _frame_stats = _parent_views[ImageView.TEMPORAL].get_statistics() if (full_fov and _frames is not None and ImageView.TEMPORAL in _parent_views) else {}
+            _pixel_stats = _parent_views[ImageView.SPATIAL].get_statistics() if (full_frames and ImageView.SPATIAL in _parent_views) else {}
+            if len(_frame_stats) > 0:
+                _frame_stats = {op: v[_frames] for op, v in _frame_stats.items()}
+                (sub.img_view if img_type == "img" else sub.img_diff_view)(ImageView.TEMPORAL, "default").set_statistics(_frame_stats)
+            if len(_pixel_stats) > 0:
+                _pixel_stats = {op: v[crop] for op, v in _pixel_stats.items()}
+                (sub.img_view if img_type == "img" else sub.img_diff_view)(ImageView.SPATIAL, "default").set_statistics(_pixel_stats)
+            # The scalar statistics follow from the per frame or per pixel statistics, as every frame (pixel) has the same number of values
+            _stats = _frame_stats if len(_frame_stats) > 0 else _pixel_stats
+            _scalar = {op: f(_stats[op]) for op, f in [("min", np.min), ("max", np.max), ("mean", np.mean)] if op in _stats}
+            if "std" in _stats and "mean" in _stats:
+                _scalar["std"] = np.sqrt(np.mean(np.square(_stats["std"].astype(np.float64)) + np.square(_stats["mean"] - _scalar["mean"])))
+            if len(_scalar) > 0:
+                (sub.img_view if img_type == "img" else sub.img_diff_view)(ImageView.DEFAULT, "default").image_props.set_statistics(_scalar)
+        logger.debug(f"Created a sub view of shape {shape} of '{self.name}' (frames {frames}, crop {crop})")
+        return sub
+
+    @staticmethod
+    def _file_identity(path: Path) -> tuple:
+        """ Returns a tuple identifying the content of a file by its path, size and modification time """
+        stat = path.stat()
+        return (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
 
     # Image loading
     
@@ -645,19 +1239,17 @@ class ImageObject(Serializable):
             self.img_view(ImageView.SPATIAL).mean_image
             task.set_step_progress(_progIni, "preparing ImgView (Spatial Std)")
             self.img_view(ImageView.SPATIAL).std_image
-            gc.collect()
             task.set_step_progress(1+_progIni, "preparing delta video")
             self.img_diff
-            gc.collect()
             task.set_step_progress(2+_progIni, "preparing ImgDiffView (Spatial Max)")
             self.img_diff_view(ImageView.SPATIAL).max_image
             task.set_step_progress(2+_progIni, "preparing ImgDiffView (Spatial Std)")
             self.img_diff_view(ImageView.SPATIAL).std_normed_image
-            gc.collect()
             task.set_step_progress(2+_progIni, "preparing ImgDiffView (Temporal Max)")
             self.img_diff_view(ImageView.TEMPORAL).max_image
             task.set_step_progress(2+_progIni, "preparing ImgDiffView (Temporal Std)")
             self.img_diff_view(ImageView.TEMPORAL).std_image
+            self.persist_views()
             gc.collect()
             logger.debug(f"Precomputed image '{self.name}' in {(time.perf_counter()-t0):1.3f} s")
 
@@ -687,18 +1279,26 @@ class ImageObject(Serializable):
         return self.precompute_image(run_async=run_async)
 
 
-    def open_file(self, path: Path|str, precompute:bool = False, run_async:bool = True) -> Task:
+    def open_file(self, path: Path|str, precompute:bool = False, run_async:bool = True, lazy: bool = False, frames: slice|None = None, 
+                  crop: tuple[slice, slice]|None = None, channel: int|None = None) -> Task:
         """ 
             Open an image using a given path.
 
             :param Path|str path: The path to the image file
             :param bool precompute: Controls if the loaded image is also precomputed
             :param bool run_async: Controls if the precomputation runs in a different thread
+            :param bool lazy: If set, TIFF and ND2 files are not loaded into memory. Instead, contiguous TIFF files are memory mapped and compressed 
+                TIFF or ND2 files are read frame by frame on demand. Falls back to loading the whole file if the file can't be opened lazily
+            :param slice|None frames: Only load the given frames (start, stop and step), e.g. slice(1000, 3000) or slice(None, None, 2). For TIFF and ND2 
+                files, the other frames are not read at all
+            :param tuple[slice, slice]|None crop: Only load the given spatial region (y, x), e.g. (slice(100, 300), slice(50, 250))
+            :param int|None channel: For colored images, use the given color channel instead of converting the image to grey scale
             :returns Task: The task object of this task
             :raises AlreadyLoading: There is already a task working on this ImageObject
             :raises FileNotFoundError: Can't find the file
             :raises UnsupportedImageError: The image is unsupported or has an error
             :raises ImageShapeError: The image has an invalid shape
+            :raises ValueError: The frame range or the crop results in an empty image or the channel does not exist
         
         """
         if self._task_open_image.running:
@@ -708,6 +1308,11 @@ class ImageObject(Serializable):
             path = Path(path)
         if not path.exists() or not path.is_file():
             raise FileNotFoundError()
+        if frames is not None or crop is not None or channel is not None:
+            _probe = ImageObject.probe(path)
+            subset_indices(_probe.shape, frames, crop)
+            if channel is not None and (len(_probe.shape) != 4 or not (0 <= channel < _probe.shape[3])):
+                raise ValueError(f"The image of shape {_probe.shape} has no color channel {channel}")
         
         self.clear()
 
@@ -715,23 +1320,31 @@ class ImageObject(Serializable):
             t0 = time.perf_counter()
             task.set_step_progress(0, "reading File")
             _metadata = None
+            img = None
+            stream = None
+            _fingerprint = disk_cache.file_fingerprint(path, frames, crop, lazy, channel) if disk_cache.enabled() else None
+            self.write_pending_views()
+            _cached = _fingerprint is not None and disk_cache.contains(_fingerprint, "img:default")
+            if lazy and (path.suffix.lower() in [".tif", ".tiff"] or nd2.is_supported_file(path)):
+                try:
+                    img = open_tiff_lazy(path, frames, crop) if path.suffix.lower() in [".tif", ".tiff"] else open_nd2_lazy(path, frames, crop)
+                except ValueError as ex:
+                    logger.warning(f"Can't open '{path.name}' lazily and therefore loading it into memory: {ex}")
+            elif path.suffix.lower() in [".tif", ".tiff"] or nd2.is_supported_file(path):
+                if (_r := ImageObject._read_stack(path, task, statistics=(precompute and not _cached), frames=frames, crop=crop)) is not None:
+                    img, stream = _r
             if path.suffix.lower() in [".tif", ".tiff"]:
                 logger.debug(f"Opening '{path.name}' with the tifffile lib")
                 with tifffile.TiffFile(path) as tif:
-                    img = tif.asarray()
-                    if tif.shaped_metadata is not None:      
-                        if len(tif.shaped_metadata) >= 2:
-                            _metadata = {i: d for i, d in enumerate(tif.shaped_metadata)}
-                        elif len(tif.shaped_metadata) == 1:
-                            _metadata = tif.shaped_metadata[0]
+                    if img is None:
+                        img = ImageObject._select(tif.asarray(), frames, crop)
+                    _metadata = ImageObject._tiff_metadata(tif)
             elif nd2.is_supported_file(path):
                 logger.debug(f"Opening '{path.name}' with the nd2 lib")
                 with nd2.ND2File(path) as nd2file:
-                    img = nd2file.asarray()
-                    if isinstance(nd2file.metadata, dict):
-                        _metadata = nd2file.metadata
-                    else:
-                        _metadata = asdict(nd2file.metadata)
+                    if img is None:
+                        img = ImageObject._select(nd2file.asarray(), frames, crop)
+                    _metadata = ImageObject._nd2_metadata(nd2file)
             else:
                 logger.debug(f"Opening '{path.name}' with PIMS")
                 try:
@@ -740,24 +1353,29 @@ class ImageObject(Serializable):
                     raise FileNotFoundError()
                 except Exception as ex:
                     raise UnsupportedImageError(path.name)
-                task.set_step_progress(1, "converting")
-                imgNP = np.zeros(shape=_pimsImg.shape, dtype=_pimsImg.dtype)
-                imgNP = [_pimsImg[i] for i in range(_pimsImg.shape[0])]
-                img = np.array(imgNP)
-                if getattr(_pimsImg, "get_metadata_raw", None) != None: 
-                    _metadata = collections.OrderedDict(sorted(_pimsImg.get_metadata_raw().items()))
+                img = ImageObject._read_pims(_pimsImg, task, frames, crop)
+                _metadata = ImageObject._pims_metadata(_pimsImg)
             if len(img.shape) not in [3,4]:
                 raise ImageShapeError(img.shape)
-            if len(img.shape) == 4 and img.shape[3] == 1:
+            if len(img.shape) == 4 and channel is not None:
+                logger.info(f"Image '{path.name}' is a colored image, using the color channel {channel}")
+                img = ImageObject._select_channel(img, channel)
+            elif len(img.shape) == 4 and img.shape[3] == 1:
                 img = np.squeeze(img, axis=3)
             elif len(img.shape) == 4 and img.shape[3] == 3:
                 logger.warning(f"Image '{path.name}' is a colored image, but will be opened as a grey scaled image")
-                img = np.dot(img[..., :3], [0.2989, 0.5870, 0.1140]).astype(img.dtype)
+                img = ImageObject._to_grayscale(img)
             self.img = img
             self._metadata = _metadata
             self._path = path
             self.name = path.name
             self.name_without_extension = path.stem
+            self._share_views((*ImageObject._file_identity(path), repr(frames), repr(crop), channel, is_lazy(self._img)))
+            self._fingerprint = _fingerprint
+            if stream is not None:
+                self._apply_statistics_stream(stream)
+            elif precompute and not _cached and is_lazy(self._img):
+                self._stream_statistics(task)
 
             t1 = time.perf_counter()
             logger.debug(f"Read file '{path.name}' in {(t1-t0):1.3f} s")
@@ -770,13 +1388,221 @@ class ImageObject(Serializable):
         self._task_open_image.start()
         return self._task_open_image
     
+    @staticmethod
+    def probe(path: Path|str) -> ImageProbe:
+        """ 
+            Reads only the header of a TIFF, ND2 or PIMS supported file and returns its shape, dtype and metadata without reading the image data
+            
+            :raises FileNotFoundError: Can't find the file
+            :raises UnsupportedImageError: The image is unsupported or has an error
+            :raises ImageShapeError: The image has an invalid shape
+        """
+        if isinstance(path, str):
+            path = Path(path)
+        if not path.exists() or not path.is_file():
+            raise FileNotFoundError()
+        t0 = time.perf_counter()
+        if path.suffix.lower() in [".tif", ".tiff"]:
+            with tifffile.TiffFile(path) as tif:
+                series = tif.series[0]
+                r = ImageProbe(path, series.shape, series.dtype, ImageObject._tiff_metadata(tif), reader="tifffile")
+        elif nd2.is_supported_file(path):
+            with nd2.ND2File(path) as nd2file:
+                r = ImageProbe(path, nd2file.shape, nd2file.dtype, ImageObject._nd2_metadata(nd2file), reader="nd2")
+        else:
+            try:
+                _pimsImg = pims.open(str(path))
+            except FileNotFoundError:
+                raise FileNotFoundError()
+            except Exception as ex:
+                raise UnsupportedImageError(path.name)
+            try:
+                r = ImageProbe(path, (len(_pimsImg), *_pimsImg.frame_shape), _pimsImg.pixel_type, ImageObject._pims_metadata(_pimsImg), reader="pims")
+            finally:
+                if callable(getattr(_pimsImg, "close", None)):
+                    _pimsImg.close()
+        if len(r.shape) not in [3,4]:
+            raise ImageShapeError(r.shape)
+        logger.debug(f"Probed '{path.name}' in {(time.perf_counter()-t0):1.3f} s: {r}")
+        return r
+
+    @staticmethod
+    def _tiff_metadata(tif: tifffile.TiffFile) -> dict|None:
+        if tif.shaped_metadata is not None:      
+            if len(tif.shaped_metadata) >= 2:
+                return {i: d for i, d in enumerate(tif.shaped_metadata)}
+            elif len(tif.shaped_metadata) == 1:
+                return tif.shaped_metadata[0]
+        return None
+
+    @staticmethod
+    def _nd2_metadata(nd2file: nd2.ND2File) -> dict|None:
+        if isinstance(nd2file.metadata, dict):
+            return nd2file.metadata
+        return asdict(nd2file.metadata)
+
+    @staticmethod
+    def _pims_metadata(pimsImg: Any) -> dict|None:
+        if getattr(pimsImg, "get_metadata_raw", None) != None: 
+            return collections.OrderedDict(sorted(pimsImg.get_metadata_raw().items()))
+        return None
+
+    @staticmethod
+    def _select(img: np.ndarray, frames: slice|None, crop: tuple[slice, slice]|None) -> np.ndarray:
+        """ Returns a copy of the selected frames and the spatial crop of an in memory image, so that the remaining image can be freed """
+        if frames is None and crop is None:
+            return img
+        _, crop, _ = subset_indices(img.shape, frames, crop)
+        return img[(frames if frames is not None else slice(None)), crop[0], crop[1]].copy()
+
+    @staticmethod
+    def _read_stack(path: Path, task: Task, statistics: bool = False, frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> tuple[np.ndarray, StackStatisticsStream|None]|None:
+        """ 
+            Reads a TIFF or ND2 file frame by frame into a preallocated array. The frames are decoded in parallel in the shared thread pool (see the setting
+            PERFORMANCE.worker_count) and the progress is reported per frame. If statistics is set, the statistics of the image and the delta video are 
+            accumulated while reading (see StackStatisticsStream). Only the selected frames and spatial crop are read. Returns None if the file can't be 
+            read frame by frame
+        """
+        t0 = time.perf_counter()
+        try:
+            stack = TiffPageStack(path, frames, crop) if path.suffix.lower() in [".tif", ".tiff"] else ND2FrameStack(path, frames, crop)
+        except ValueError as ex:
+            logger.debug(f"Can't read '{path.name}' frame by frame: {ex}")
+            return None
+        try:
+            if len(stack.shape) != 3:
+                return None
+            img = np.empty(shape=stack.shape, dtype=stack.dtype)
+            stream = None
+            if statistics:
+                # The delta video is calculated in a signed dtype of the same size. If the image maximum turns out to be too large, it is discarded later
+                delta_dtype = np.dtype(f"i{stack.dtype.itemsize}") if stack.dtype.kind == "u" else stack.dtype
+                delta_out = None
+                if not UserSettings.IMAGE_LOADING.lazy_delta.get():
+                    delta_out = np.empty(shape=(max(img.shape[0] - 1, 0), *img.shape[1:]), dtype=delta_dtype)
+                stream = StackStatisticsStream(img.shape, delta_dtype=delta_dtype, delta_out=delta_out)
+            _callback = lambda i: task.set_step_progress(0, f"reading File (frame {i + 1}/{img.shape[0]})")
+            for start, chunk in stack.read_into(img, chunk_size=frames_per_chunk(stack, chunk_bytes=STAT_CHUNK_ELEMENTS*stack.dtype.itemsize), callback=_callback):
+                if stream is not None:
+                    stream.update(chunk)
+            if stream is not None:
+                stream.finish()
+        finally:
+            stack.close()
+        logger.debug(f"Read '{path.name}' frame by frame{' with streaming statistics' if statistics else ''} in {(time.perf_counter()-t0):1.3f} s")
+        return img, stream
+
+    @staticmethod
+    def _to_grayscale(img: np.ndarray) -> np.ndarray:
+        """ 
+            Converts a colored image stack (t, y, x, c) to grey scale using the luminance of the first three channels. The conversion is done chunk wise 
+            into a preallocated array of the original dtype, so that only a chunk sized float64 buffer is needed
+        """
+        t0 = time.perf_counter()
+        out = np.empty(shape=img.shape[:3], dtype=img.dtype)
+        weights = np.array([0.2989, 0.5870, 0.1140])
+        def _convert(c: tuple[int, np.ndarray]) -> None:
+            start, chunk = c
+            out[start:(start + chunk.shape[0])] = np.dot(chunk[..., :3], weights)
+        for _ in parallel_map(_convert, iter_chunks(img, frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS))):
+            pass
+        logger.debug(f"Converted the colored image to grey scale in {(time.perf_counter()-t0):1.3f} s")
+        return out
+
+    @staticmethod
+    def _select_channel(img: np.ndarray, channel: int) -> np.ndarray:
+        """ 
+            Copies a color channel of an image stack (t, y, x, c) chunk wise into a preallocated contiguous array, so that the colored stack is not kept 
+            alive as base of a strided view
+        """
+        t0 = time.perf_counter()
+        out = np.empty(shape=img.shape[:3], dtype=img.dtype)
+        def _copy(c: tuple[int, np.ndarray]) -> None:
+            start, chunk = c
+            out[start:(start + chunk.shape[0])] = chunk[..., channel]
+        for _ in parallel_map(_copy, iter_chunks(img, frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS))):
+            pass
+        logger.debug(f"Copied the color channel {channel} in {(time.perf_counter()-t0):1.3f} s")
+        return out
+
+    @staticmethod
+    def _read_pims(pimsImg: Any, task: Task, frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> np.ndarray:
+        """ Reads the (selected) frames of a PIMS image sequence into a preallocated array frame by frame and reports the progress """
+        t0 = time.perf_counter()
+        frame_indices, crop, shape = subset_indices((len(pimsImg), *pimsImg.frame_shape), frames, crop)
+        n = len(frame_indices)
+        img = np.empty(shape=shape, dtype=np.dtype(pimsImg.pixel_type))
+        for i, t in enumerate(frame_indices):
+            img[i] = np.asarray(pimsImg[t])[crop]
+            task.set_step_progress(1, f"converting (frame {i + 1}/{n})")
+        logger.debug(f"Read {n} frames with PIMS in {(time.perf_counter()-t0):1.3f} s")
+        return img
+
+    def _stream_statistics(self, task: Task) -> None:
+        """
+            Calculates the statistics of a lazy image and its delta video in a single pass over the stack (see StackStatisticsStream) and seeds the cached 
+            views with them, as otherwise every statistic decodes a compressed file again. The subsamples for the display range of the image and the delta 
+            video are collected in the same pass
+        """
+        img = self._img
+        if img is None or len(img.shape) != 3 or img.shape[0] < 2:
+            return
+        t0 = time.perf_counter()
+        # The delta video is accumulated in a wider signed dtype, as the image maximum (and therefore the dtype of the delta video) is not known yet
+        delta_dtype = np.dtype(f"i{min(2*img.dtype.itemsize, 8)}") if img.dtype.kind == "u" else img.dtype
+        stream = StackStatisticsStream(img.shape, delta_dtype=delta_dtype)
+        frames, stride = ImageProperties._sample_layout(img.shape)
+        delta_frames, delta_stride = ImageProperties._sample_layout((img.shape[0] - 1, *img.shape[1:]))
+        samples: list[np.ndarray] = []
+        delta_samples: list[np.ndarray] = []
+        prev: np.ndarray|None = None
+        for start, chunk in iter_chunks(img, frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS*img.dtype.itemsize)):
+            stream.update(chunk)
+            samples.extend(chunk[t - start][::stride, ::stride].copy() for t in frames[(frames >= start) & (frames < start + chunk.shape[0])])
+            # The delta frame t needs the frames t and t+1, where frame t may be the last frame of the previous chunk
+            for t in delta_frames[(delta_frames >= start - 1) & (delta_frames < start + chunk.shape[0] - 1)]:
+                _f0 = prev if t < start else chunk[t - start]
+                _f0, _f1 = _f0[::delta_stride, ::delta_stride], chunk[t + 1 - start][::delta_stride, ::delta_stride]
+                delta_samples.append(np.subtract(_f1, _f0, dtype=delta_dtype))
+            prev = chunk[-1]
+            task.set_step_progress(0, f"calculating statistics (frame {start + chunk.shape[0]}/{img.shape[0]})")
+        stream.finish()
+        self._apply_statistics_stream(stream)
+        self.img_props._sample = np.stack(samples).reshape(-1)
+        if self.img_diff is not None:
+            self.img_diff_props._sample = np.stack(delta_samples).reshape(-1).astype(self.img_diff.dtype)
+        logger.debug(f"Calculated the statistics of the lazy image '{self.name}' in a single pass in {(time.perf_counter()-t0):1.3f} s")
+
+    def _apply_statistics_stream(self, stream: StackStatisticsStream) -> None:
+        """ Seeds the cached views and properties of the image and the delta video with the statistics accumulated while reading the file """
+        _stats = stream.result(None)
+        if self._img is None or _stats is None or tuple(self._img.shape) != stream.shape:
+            return
+        if _stats["max"] <= 1 and not is_lazy(self._img):
+            return # The img setter has scaled the image. Lazy images are streamed after scaling (see _stream_statistics)
+        self.img_view(ImageView.DEFAULT, "default").image_props.set_statistics(_stats, dtype=self._img.dtype)
+        for mode in [ImageView.SPATIAL, ImageView.TEMPORAL]:
+            if (r := stream.result(mode.value)) is not None:
+                self.img_view(mode, "default").set_statistics(r, dtype=self._img.dtype)
+
+        delta_dtype = ImageObject._signed_dtype(self._img.dtype, _stats["max"])
+        if stream.delta_dtype is None or stream.result(None, delta=True) is None or delta_dtype.itemsize > stream.delta_dtype.itemsize:
+            logger.debug(f"Discarding the streamed delta video, as it does not fit into {stream.delta_dtype}")
+            return
+        if stream.delta_out is not None and self._img_diff is None:
+            self._img_diff = stream.delta_out.astype(delta_dtype, copy=False)
+        self.img_diff_view(ImageView.DEFAULT, "default").image_props.set_statistics(cast(dict, stream.result(None, delta=True)), dtype=delta_dtype)
+        for mode in [ImageView.SPATIAL, ImageView.TEMPORAL]:
+            if (r := stream.result(mode.value, delta=True)) is not None:
+                self.img_diff_view(mode, "default").set_statistics(r, dtype=delta_dtype)
+
     def export_img(self, path: Path) -> None:
         """ Export the current img """
         if self.img is None:
             raise NoImageError()
         match path.suffix.lower():
             case ".tif"|".tiff":
-                tifffile.imwrite(path, data=self.img, metadata=self.metadata, compression="zlib")
+                ImageObject._write_tiff(path, self.img, self.metadata)
             case _:
                 raise UnsupportedExtensionError(f"The extension '{path.suffix}' is not supported for exporting")
         logger.info(f"Exported the video as '{path.name}'")
@@ -787,7 +1613,7 @@ class ImageObject(Serializable):
             raise NoImageError()
         match path.suffix.lower():
             case ".tif"|".tiff":
-                tifffile.imwrite(path, data=self.img_diff, metadata=self.metadata, compression="zlib")
+                ImageObject._write_tiff(path, self.img_diff, self.metadata)
             case _:
                 raise UnsupportedExtensionError(f"The extension '{path.suffix}' is not supported for exporting")
         logger.info(f"Exported the delta video as '{path.name}'")
@@ -796,11 +1622,80 @@ class ImageObject(Serializable):
 
     @staticmethod
     def _is_valid_image_stack(image: Any) -> bool:
-        if not isinstance(image, np.ndarray):
+        if not isinstance(image, (np.ndarray, LazyImageStack)):
             return False
         if len(image.shape) != 3:
             return False
         return True
+
+    @staticmethod
+    def _narrow_image(image: np.ndarray, signed: bool) -> tuple[np.ndarray, Any, Any]:
+        """
+            Prepares an image for the use in an ImageObject: Images with a maximum of at most 1 are scaled by 255 and integer images are converted to the 
+            smallest (signed or unsigned) integer dtype holding the maximum. Minimum and maximum are determined in one chunked pass and the conversion
+            is done chunk wise into the final array, so that no full size temporary copies are created. If no conversion is needed, the image is
+            returned as it is
+
+            :returns tuple[np.ndarray, Any, Any]: The converted image and its minimum and maximum
+            :raises UnsupportedImageError: The image dtype is not supported
+        """
+        if image.dtype.kind not in ("b", "i", "u", "f"):
+            raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
+        t0 = time.perf_counter()
+        _stats = stack_statistics(image, axis=None, ops=("min", "max"))
+        _min, _max = _stats["min"], _stats["max"]
+        scale = None
+        if _max <= 1:
+            scale = 255
+            _min, _max = 255*_min, 255*_max
+        dtype = image.dtype
+        if image.dtype.kind in ("b", "i", "u"):
+            if signed:
+                _dtypes = [(2**7, np.int8), (2**15, np.int16), (2**31, np.int32), (2**63, np.int64)]
+            else:
+                _dtypes = [(2**8, np.uint8), (2**16, np.uint16), (2**32, np.uint32), (2**63, np.uint64)] # Here 2**63 to support also the signed datatype
+            for _limit, _dtype in _dtypes:
+                if _max < _limit:
+                    dtype = np.dtype(_dtype)
+                    break
+            else:
+                raise UnsupportedImageError(f"The image dtype ({image.dtype}) is not supported")
+        if dtype == image.dtype and scale is None:
+            return image, _min, _max
+        
+        out = np.empty(image.shape, dtype=dtype)
+        def _convert(c: tuple[int, np.ndarray]) -> None:
+            start, chunk = c
+            if scale is None:
+                out[start:(start + chunk.shape[0])] = chunk
+            else:
+                np.multiply(chunk, scale, out=out[start:(start + chunk.shape[0])], casting="unsafe")
+        for _ in parallel_map(_convert, iter_chunks(image)):
+            pass
+        logger.debug(f"Converted the image from {image.dtype} to {dtype}{' (scaled by 255)' if scale is not None else ''} in {(time.perf_counter()-t0):1.3f} s")
+        return out, _min, _max
+
+    @staticmethod
+    def _signed_dtype(dtype: np.dtype, _max: Any) -> np.dtype:
+        """ Returns the smallest signed dtype which can hold an image of the given dtype and maximum """
+        if dtype.kind in ("i", "f"):
+            return dtype
+        if _max < 2**7:
+            return np.dtype("int8")
+        elif _max < 2**15:
+            return np.dtype("int16")
+        elif _max < 2**31:
+            return np.dtype("int32")
+        return np.dtype("int64")
+
+    @staticmethod
+    def _write_tiff(path: Path, img: np.ndarray|LazyImageStack, metadata: dict|None) -> None:
+        """ Writes an image stack as zlib compressed TIFF. Lazy stacks are written chunk wise """
+        if isinstance(img, LazyImageStack):
+            _frames = (frame for _, chunk in iter_chunks(img) for frame in chunk)
+            tifffile.imwrite(path, data=_frames, shape=img.shape, dtype=img.dtype, metadata=metadata, compression="zlib")
+        else:
+            tifffile.imwrite(path, data=img, metadata=metadata, compression="zlib")
     
 class ImageView(Enum):
     """ 
@@ -0,0 +1,360 @@
+""" Chunked and multithreaded calculation of image statistics (mean, std, min and max) in a single pass over an image stack """
+from ..core.logs import logger
+from .lazy_image import LazyImageStack, iter_chunks, frames_per_chunk
+from .parallel import parallel_map, get_executor, in_worker, worker_count
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Any
+import time
+import numpy as np
+
+STAT_OPS: tuple[str, ...] = ("mean", "std", "min", "max")
+""" The statistics supported by stack_statistics() """
+
+STAT_CHUNK_ELEMENTS: int = 4*1024**2
+""" Targeted number of elements per chunk. As the deviations are calculated as float32, a chunk needs temporarily about 4 bytes per element """
+
+def stack_statistics(img: np.ndarray|LazyImageStack, axis: tuple|None, ops: tuple[str, ...]|list[str] = STAT_OPS, chunk_size: int|None = None) -> dict[str, Any]:
+    """
+        Calculates the given statistics (a subset of 'mean', 'std', 'min' and 'max') of an image stack (t, y, x) in one chunked pass. The chunks are
+        distributed over the shared thread pool and merged using the algorithm of Chan et al. for the mean and the sum of squared deviations (M2).
+
+        :param axis: Follows numpy's convention: (0,) reduces the temporal component and returns 2D images, (1,2) returns a value per frame and None
+            (or (0,1,2)) returns scalars
+        :returns dict[str, Any]: The requested statistics. Mean and std are float32 images (float64 scalars for axis=None), min and max keep the image dtype
+        :raises ValueError: The axis is not supported
+    """
+    ops = tuple(op for op in STAT_OPS if op in ops)
+    if len(ops) == 0:
+        return {}
+    ndim = len(img.shape)
+    if axis is not None and tuple(axis) == tuple(range(ndim)):
+        axis = None
+    if axis is not None and tuple(axis) not in [(0,), (1, 2)]:
+        raise ValueError(f"Unsupported axis {axis} for calculating the stack statistics")
+    if ndim != 3:
+        raise ValueError(f"stack_statistics() requires an image stack of shape (t, y, x), but got shape {img.shape}")
+    if chunk_size is None:
+        chunk_size = frames_per_chunk(img, chunk_bytes=STAT_CHUNK_ELEMENTS*img.dtype.itemsize)
+
+    t0 = time.perf_counter()
+    _frame_axis = (1, 2) if axis is None else tuple(axis)
+    _stats = parallel_map(lambda c: _chunk_statistics(c[1], _frame_axis, ops), iter_chunks(img, chunk_size))
+    if _frame_axis == (1, 2):
+        # Statistics per frame can simply be concatenated
+        _parts = list(_stats)
+        r: dict[str, Any] = {}
+        if len(_parts) > 0:
+            r = {k: np.concatenate([p[k] for p in _parts]) for k in _parts[0].keys() if k != "n"}
+            r["n"] = int(np.prod(img.shape[1:]))
+    else:
+        r = {}
+        for s in _stats:
+            r = _merge_statistics(r, s) if len(r) > 0 else s
+    if axis is None and len(r) > 0:
+        r = _collapse_frame_statistics(r)
+    logger.debug(f"Calculated the statistics {', '.join(ops)} on axis {axis} for an image of shape {img.shape} in {(time.perf_counter() - t0):1.3f} s")
+    return _finalize_statistics(r, ops, scalar=(axis is None))
+
+def _chunk_statistics(chunk: np.ndarray, axis: tuple, ops: tuple[str, ...]) -> dict[str, Any]:
+    """ Calculates the count n and (if requested) mean, M2, min and max over the given axis of a single chunk """
+    r: dict[str, Any] = {"n": int(np.prod([chunk.shape[a] for a in axis]))}
+    if "min" in ops:
+        r["min"] = np.min(chunk, axis=axis)
+    if "max" in ops:
+        r["max"] = np.max(chunk, axis=axis)
+    if "mean" in ops or "std" in ops:
+        _mean = np.mean(chunk, axis=axis, dtype="float64")
+        r["mean"] = _mean
+        if "std" in ops:
+            _mean_b = _mean[None, :, :] if axis == (0,) else _mean[:, None, None]
+            d = np.subtract(chunk, _mean_b, dtype="float32")
+            np.square(d, out=d)
+            r["m2"] = np.sum(d, axis=axis, dtype="float64")
+    return r
+
+def _merge_statistics(a: dict[str, Any], b: dict[str, Any]) -> dict[str, Any]:
+    """ Merges the statistics of two chunks (reduced over the same axis) """
+    n = a["n"] + b["n"]
+    r: dict[str, Any] = {"n": n}
+    if "min" in a:
+        r["min"] = np.minimum(a["min"], b["min"])
+    if "max" in a:
+        r["max"] = np.maximum(a["max"], b["max"])
+    if "mean" in a:
+        delta = b["mean"] - a["mean"]
+        r["mean"] = a["mean"] + delta*(b["n"]/n)
+        if "m2" in a:
+            r["m2"] = a["m2"] + b["m2"] + np.square(delta)*(a["n"]*b["n"]/n)
+    return r
+
+def _collapse_frame_statistics(r: dict[str, Any]) -> dict[str, Any]:
+    """ Reduces per frame statistics (each frame with the same count n) into statistics of the whole stack """
+    t = len(next(v for k, v in r.items() if k != "n"))
+    c: dict[str, Any] = {"n": r["n"]*t}
+    if "min" in r:
+        c["min"] = np.min(r["min"])
+    if "max" in r:
+        c["max"] = np.max(r["max"])
+    if "mean" in r:
+        c["mean"] = np.mean(r["mean"], dtype="float64")
+        if "m2" in r:
+            c["m2"] = np.sum(r["m2"], dtype="float64") + r["n"]*np.sum(np.square(r["mean"] - c["mean"]), dtype="float64")
+    return c
+
+def _finalize_statistics(r: dict[str, Any], ops: tuple[str, ...], scalar: bool) -> dict[str, Any]:
+    """ Converts the merged raw statistics into the requested output format """
+    if len(r) == 0:
+        return {op: None for op in ops}
+    out: dict[str, Any] = {}
+    _float = np.float64 if scalar else (lambda x: np.asarray(x, dtype="float32"))
+    for op in ops:
+        match op:
+            case "mean":
+                out[op] = _float(r["mean"])
+            case "std":
+                out[op] = _float(np.sqrt(r["m2"]/r["n"]))
+            case "min"|"max":
+                out[op] = r[op]
+    return out
+
+class StackStatisticsStream:
+    """
+        Accumulates the statistics (mean, std, min and max) of an image stack fed chunk by chunk in frame order (for example while the file is read), so
+        that the statistics over all axes ((0,), (1,2) and None) are available without another pass over the data. Optionally, the statistics of the 
+        delta video (img[t+1] - img[t]) are accumulated as well and the delta video can be written into a preallocated array.
+        The chunks are processed in the shared thread pool while the caller reads the next chunk.
+    """
+
+    def __init__(self, shape: tuple[int, ...], delta_dtype: Any = None, delta_out: np.ndarray|None = None, ops: tuple[str, ...] = STAT_OPS):
+        """
+            :param tuple shape: The shape (t, y, x) of the whole image stack
+            :param delta_dtype: If not None, also accumulate the statistics of the delta video calculated in this (signed) dtype
+            :param np.ndarray|None delta_out: Optional preallocated array of shape (t-1, y, x) and dtype delta_dtype to store the delta video in
+        """
+        self.shape = tuple(shape)
+        self.ops = tuple(op for op in STAT_OPS if op in ops)
+        self.delta_dtype = np.dtype(delta_dtype) if delta_dtype is not None else None
+        self.delta_out = delta_out
+        self._next_frame = 0
+        self._prev: np.ndarray|None = None
+        self._pending: deque[Future[dict[str, Any]]] = deque()
+        self._frames: dict[str, list[dict[str, Any]]] = {"img": [], "delta": []}
+        self._spatial: dict[str, dict[str, Any]] = {"img": {}, "delta": {}}
+        self._results: dict[tuple[str, tuple|None], dict[str, Any]] = {}
+
+    def update(self, chunk: np.ndarray) -> None:
+        """ Feed the next chunk of frames. The chunk must not be modified afterwards, as it is processed asynchronously """
+        if chunk.shape[0] == 0:
+            return
+        start, prev = self._next_frame, self._prev
+        self._next_frame += chunk.shape[0]
+        self._prev = chunk[-1]
+        if in_worker() or worker_count() == 1:
+            self._merge(self._process(start, chunk, prev))
+            return
+        self._pending.append(get_executor().submit(self._process, start, chunk, prev))
+        while len(self._pending) > 2*worker_count():
+            self._merge(self._pending.popleft().result())
+
+    def _process(self, start: int, chunk: np.ndarray, prev: np.ndarray|None) -> dict[str, Any]:
+        r: dict[str, Any] = {"img": (_chunk_statistics(chunk, (1, 2), self.ops), _chunk_statistics(chunk, (0,), self.ops))}
+        if self.delta_dtype is not None:
+            _chunk = chunk.view(self.delta_dtype) if chunk.dtype.itemsize == self.delta_dtype.itemsize else chunk.astype(self.delta_dtype)
+            if prev is not None:
+                _prev = prev.view(self.delta_dtype) if prev.dtype.itemsize == self.delta_dtype.itemsize else prev.astype(self.delta_dtype)
+                _chunk = np.concatenate([_prev[None, :, :], _chunk])
+                start -= 1
+            if _chunk.shape[0] < 2:
+                return r
+            if self.delta_out is not None:
+                d = self.delta_out[start:(start + _chunk.shape[0] - 1)]
+                np.subtract(_chunk[1:], _chunk[:-1], out=d)
+            else:
+                d = np.subtract(_chunk[1:], _chunk[:-1])
+            r["delta"] = (_chunk_statistics(d, (1, 2), self.ops), _chunk_statistics(d, (0,), self.ops))
+        return r
+
+    def _merge(self, r: dict[str, Any]) -> None:
+        for k, (frame_stats, spatial_stats) in r.items():
+            self._frames[k].append(frame_stats)
+            self._spatial[k] = _merge_statistics(self._spatial[k], spatial_stats) if len(self._spatial[k]) > 0 else spatial_stats
+
+    def finish(self) -> None:
+        """ Waits for all pending chunks and calculates the final statistics """
+        while len(self._pending) > 0:
+            self._merge(self._pending.popleft().result())
+        if self._next_frame != self.shape[0]:
+            raise ValueError(f"The stream received {self._next_frame} frames, but the image stack has {self.shape[0]} frames")
+        for k in ["img", "delta"]:
+            if len(self._frames[k]) == 0:
+                continue
+            _frames = {op: np.concatenate([p[op] for p in self._frames[k]]) for op in self._frames[k][0].keys() if op != "n"}
+            _frames["n"] = self._frames[k][0]["n"]
+            self._results[(k, (1, 2))] = _finalize_statistics(_frames, self.ops, scalar=False)
+            self._results[(k, None)] = _finalize_statistics(_collapse_frame_statistics(_frames), self.ops, scalar=True)
+            self._results[(k, (0,))] = _finalize_statistics(self._spatial[k], self.ops, scalar=False)
+        self._frames, self._spatial = {"img": [], "delta": []}, {"img": {}, "delta": {}}
+
+    def result(self, axis: tuple|None, delta: bool = False) -> dict[str, Any]|None:
+        """ Returns the statistics on the given axis ((0,), (1,2) or None) of the image or the delta video. Returns None if not available (yet) """
+        if axis is not None and tuple(axis) == (0, 1, 2):
+            axis = None
+        return self._results.get(("delta" if delta else "img", tuple(axis) if axis is not None else None), None)
+
+MEDIAN_HIST_BYTES: int = 64*1024**2
+""" Targeted size of the histogram counts (including the temporary counts of a frame chunk) per pixel block when calculating the median over the temporal axis """
+
+APPROX_MEDIAN_BINS: int = 4096
+""" Number of histogram bins used for the approximate median of float images """
+
+def stack_median(img: np.ndarray|LazyImageStack, axis: tuple|None, vmin: Any = None, vmax: Any = None, approximate: bool = False) -> Any:
+    """
+        Calculates the median of an image stack (t, y, x) in bounded memory. For integer images with a value range of at most 2^16 (e.g. uint8 and uint16),
+        the exact median is derived from histograms (counting sort) in linear time. For float images, an approximate median can be calculated from a
+        histogram with APPROX_MEDIAN_BINS bins. As the cost of a histogram grows with the number of bins, histograms per frame (per pixel) are only used
+        if there are not more bins than values per frame (frames). Otherwise the image is processed chunk (axis=(1,2)) or pixel block wise (axis=(0,)) 
+        with np.median.
+
+        :param axis: Follows numpy's convention: (0,) reduces the temporal component and returns a 2D image, (1,2) returns a value per frame and None
+            (or (0,1,2)) returns a scalar
+        :param vmin: The minimum of the image (e.g. from cached statistics). Calculated if not provided
+        :param vmax: The maximum of the image (e.g. from cached statistics). Calculated if not provided
+        :param bool approximate: Allow an approximate median for float images
+        :returns: The median as float64 (like np.median)
+        :raises ValueError: The axis is not supported
+    """
+    ndim = len(img.shape)
+    if axis is not None and tuple(axis) == tuple(range(ndim)):
+        axis = None
+    if axis is not None and tuple(axis) not in [(0,), (1, 2)]:
+        raise ValueError(f"Unsupported axis {axis} for calculating the median")
+    if ndim != 3:
+        raise ValueError(f"stack_median() requires an image stack of shape (t, y, x), but got shape {img.shape}")
+    if img.size == 0:
+        return np.median(np.asarray(img), axis=axis)
+    t0 = time.perf_counter()
+    if vmin is None or vmax is None:
+        _stats = stack_statistics(img, axis=None, ops=("min", "max"))
+        vmin, vmax = _stats["min"], _stats["max"]
+
+    scale = None
+    _chunk_size = frames_per_chunk(img, STAT_CHUNK_ELEMENTS*img.dtype.itemsize)
+    if img.dtype.kind in ("u", "i") and int(vmax) - int(vmin) < 2**16:
+        mode, nbins, vmin = "histogram", int(vmax) - int(vmin) + 1, int(vmin)
+    elif img.dtype.kind == "f" and approximate and np.isfinite(vmin) and np.isfinite(vmax):
+        mode, nbins, vmin = "approximate", APPROX_MEDIAN_BINS, float(vmin)
+        scale = (nbins - 1)/(float(vmax) - vmin) if vmax > vmin else 1.0
+    else:
+        mode, nbins = "numpy", 0
+    if mode != "numpy" and axis is not None and nbins > (img.shape[0] if axis == (0,) else img.shape[1]*img.shape[2]):
+        mode, nbins = "numpy", 0 # Sorting the values of a frame (pixel) is cheaper than a histogram with more bins than values
+
+    if mode == "numpy":
+        if axis is None:
+            r = np.median(np.asarray(img))
+        elif axis == (1, 2):
+            r = np.concatenate(list(parallel_map(lambda c: np.median(c[1], axis=(1, 2)), iter_chunks(img, _chunk_size))))
+        else:
+            r = np.concatenate(list(parallel_map(lambda b: np.median(b, axis=0), _iter_row_bands(img, _rows_per_band(img, STAT_CHUNK_ELEMENTS // img.shape[0])))), axis=0)
+    elif axis is None:
+        counts = np.zeros(nbins, dtype=np.int64)
+        for c in parallel_map(lambda c: np.bincount(_value_bins(c[1], vmin, nbins, scale).ravel(), minlength=nbins), iter_chunks(img, _chunk_size)):
+            counts += c
+        r = _median_from_counts(counts[None, :], img.size, vmin, scale)[0]
+    elif axis == (1, 2):
+        r = np.concatenate(list(parallel_map(lambda c: _frame_median(c[1], vmin, nbins, scale), iter_chunks(img, _chunk_size))))
+    else:
+        r = np.concatenate(list(parallel_map(lambda b: _pixel_median(b, vmin, nbins, scale), _iter_row_bands(img, _rows_per_band(img, MEDIAN_HIST_BYTES // (12*nbins))), max_pending=2)), axis=0)
+    logger.debug(f"Calculated the median ({mode}) on axis {axis} for an image of shape {img.shape} in {(time.perf_counter() - t0):1.3f} s")
+    return r
+
+def stack_percentile(img: np.ndarray|LazyImageStack, q: float, axis: tuple|None) -> Any:
+    """
+        Calculates the q-th percentile (0 to 100, linear interpolation like np.percentile) of an image stack (t, y, x) in bounded memory: Per frame 
+        percentiles (axis=(1,2)) are calculated over chunks of frames and per pixel percentiles (axis=(0,)) over bands of rows, both in parallel. The 
+        percentile of the whole stack is derived from a histogram for integer images with a value range of at most 2^16, otherwise the image is loaded
+
+        :param axis: Follows numpy's convention (see stack_median)
+        :raises ValueError: The axis is not supported
+    """
+    ndim = len(img.shape)
+    if axis is not None and tuple(axis) == tuple(range(ndim)):
+        axis = None
+    if axis is not None and tuple(axis) not in [(0,), (1, 2)]:
+        raise ValueError(f"Unsupported axis {axis} for calculating a percentile")
+    if ndim != 3:
+        raise ValueError(f"stack_percentile() requires an image stack of shape (t, y, x), but got shape {img.shape}")
+    if img.size == 0:
+        return np.percentile(np.asarray(img), q, axis=axis)
+    t0 = time.perf_counter()
+    if axis == (1, 2):
+        r = np.concatenate(list(parallel_map(lambda c: np.percentile(c[1], q, axis=(1, 2)), iter_chunks(img, frames_per_chunk(img, STAT_CHUNK_ELEMENTS*img.dtype.itemsize)))))
+    elif axis == (0,):
+        r = np.concatenate(list(parallel_map(lambda b: np.percentile(b, q, axis=0), _iter_row_bands(img, _rows_per_band(img, STAT_CHUNK_ELEMENTS // img.shape[0])))), axis=0)
+    else:
+        _stats = stack_statistics(img, axis=None, ops=("min", "max"))
+        vmin, vmax = _stats["min"], _stats["max"]
+        if img.dtype.kind in ("u", "i") and int(vmax) - int(vmin) < 2**16:
+            vmin, nbins = int(vmin), int(vmax) - int(vmin) + 1
+            counts = np.zeros(nbins, dtype=np.int64)
+            for c in parallel_map(lambda c: np.bincount(_value_bins(c[1], vmin, nbins, None).ravel(), minlength=nbins), iter_chunks(img)):
+                counts += c
+            cum = np.cumsum(counts)
+            h = (img.size - 1)*q/100
+            lo, hi = (int(np.argmax(cum > k)) + vmin for k in (np.floor(h), np.ceil(h)))
+            r = lo + (h - np.floor(h))*(hi - lo)
+        else:
+            r = np.percentile(np.asarray(img), q)
+    logger.debug(f"Calculated the {q:g}th percentile on axis {axis} for an image of shape {img.shape} in {(time.perf_counter() - t0):1.3f} s")
+    return r
+
+def _rows_per_band(img: np.ndarray|LazyImageStack, pixels: int) -> int:
+    """ Returns the number of image rows so that a band contains about the given number of pixels (at least one row) """
+    return max(1, pixels // max(1, img.shape[2]))
+
+def _iter_row_bands(img: np.ndarray|LazyImageStack, rows: int):
+    """ Yields bands img[:, y0:y1, :] of the given number of rows. For lazy stacks, the stack is read once per band """
+    for y0 in range(0, img.shape[1], rows):
+        yield img[:, y0:(y0 + rows), :]
+
+def _value_bins(chunk: np.ndarray, vmin: Any, nbins: int, scale: float|None) -> np.ndarray:
+    """ Maps the values of a chunk to their histogram bin (exact for integer histograms, scaled for approximate float histograms) """
+    if scale is None:
+        return chunk.astype(np.int64) - vmin
+    return np.clip(((chunk - vmin)*scale).astype(np.int64), 0, nbins - 1)
+
+def _frame_median(chunk: np.ndarray, vmin: Any, nbins: int, scale: float|None) -> np.ndarray:
+    """ Calculates the median of each frame of the chunk using one histogram per frame """
+    c = chunk.shape[0]
+    idx = _value_bins(chunk, vmin, nbins, scale).reshape(c, -1)
+    idx += (np.arange(c, dtype=np.int64)*nbins)[:, None]
+    counts = np.bincount(idx.ravel(), minlength=c*nbins).reshape(c, nbins)
+    return _median_from_counts(counts, idx.shape[1], vmin, scale)
+
+def _pixel_median(band: np.ndarray, vmin: Any, nbins: int, scale: float|None) -> np.ndarray:
+    """ Calculates the median over time of each pixel in the band (t, rows, x) by accumulating one histogram per pixel over frame chunks """
+    t, p = band.shape[0], int(np.prod(band.shape[1:]))
+    offsets = (np.arange(p, dtype=np.int64)*nbins).reshape(band.shape[1:])
+    counts = np.zeros(p*nbins, dtype=np.int32 if t < 2**31 else np.int64)
+    step = max(1, STAT_CHUNK_ELEMENTS // max(1, p))
+    for t0 in range(0, t, step):
+        idx = _value_bins(band[t0:(t0 + step)], vmin, nbins, scale)
+        idx += offsets[None, :, :]
+        counts += np.bincount(idx.ravel(), minlength=p*nbins)
+    return _median_from_counts(counts.reshape(p, nbins), t, vmin, scale).reshape(band.shape[1:])
+
+def _median_from_counts(counts: np.ndarray, n: int, vmin: Any, scale: float|None) -> np.ndarray:
+    """ Derives the median of each row of a histogram counts array (groups, bins) containing n values per group """
+    cum = np.cumsum(counts, axis=1)
+    _values = []
+    for k in ((n - 1) // 2, n // 2):
+        b = np.argmax(cum > k, axis=1)
+        if scale is None:
+            _values.append(b.astype(np.float64) + vmin)
+        else:
+            c_b = np.take_along_axis(counts, b[:, None], axis=1)[:, 0]
+            below = np.take_along_axis(cum, b[:, None], axis=1)[:, 0] - c_b
+            _values.append(vmin + (b + (k - below + 0.5)/np.maximum(c_b, 1))/scale)
+    return (_values[0] + _values[1])/2
@@ -0,0 +1,501 @@
+""" Module providing image stacks, which are not held in memory as a whole but read or calculated chunk wise on demand """
+from ..core.logs import logger
+from .parallel import parallel_map
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Callable
+import threading
+import time
+import numpy as np
+import tifffile
+import nd2
+
+CHUNK_BYTES: int = 64*1024**2
+""" Targeted size of a chunk in bytes when iterating chunk wise over an image stack """
+
+class LazyImageStack:
+    """
+        Abstract base class for an image stack (t, y, x) whose frames are provided on demand instead of being held in memory. Subclasses must only implement
+        get_frames(). Supports numpy like indexing (for example stack[frame], stack[start:stop, y0:y1, x0:x1] or stack[:, yy, xx]) by reading only the
+        requested frames. Converting the stack with np.asarray() will load the whole stack into memory
+    """
+
+    def __init__(self, shape: tuple[int, ...], dtype: Any):
+        self._shape = tuple(int(s) for s in shape)
+        self._dtype = np.dtype(dtype)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def ndim(self) -> int:
+        return len(self._shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self._shape))
+
+    @property
+    def nbytes(self) -> int:
+        """ The size of the stack in bytes if it would be loaded into memory """
+        return self.size*self._dtype.itemsize
+
+    def __len__(self) -> int:
+        return self._shape[0]
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        """ Returns the frames [start, stop) as numpy array. Must be implemented by every subclass """
+        raise NotImplementedError()
+
+    def read_frames_into(self, start: int, stop: int, out: np.ndarray, callback: Callable[[int], Any]|None = None) -> None:
+        """ 
+            Reads the frames [start, stop) into the given array of shape (stop - start, y, x). Subclasses may override this to prevent a copy
+
+            :param Callable[[int], Any]|None callback: Called in order with the index of every frame read
+        """
+        out[...] = self.get_frames(start, stop)
+        if callback is not None:
+            for i in range(start, stop):
+                callback(i)
+
+    def read_into(self, out: np.ndarray, chunk_size: int|None = None, callback: Callable[[int], Any]|None = None) -> Iterator[tuple[int, np.ndarray]]:
+        """ 
+            Reads the whole stack chunk wise into the preallocated array out and yields after every chunk the tuple (index of first frame, chunk as view of out) 
+        
+            :param Callable[[int], Any]|None callback: Called in order with the index of every frame read (e.g. to report the progress)
+        """
+        if chunk_size is None:
+            chunk_size = frames_per_chunk(self)
+        for start in range(0, self._shape[0], chunk_size):
+            stop = min(start + chunk_size, self._shape[0])
+            self.read_frames_into(start, stop, out[start:stop], callback=callback)
+            yield start, out[start:stop]
+
+    def iter_chunks(self, chunk_size: int|None = None) -> Iterator[tuple[int, np.ndarray]]:
+        """ Iterate over the stack in chunks of chunk_size frames (defaults to about CHUNK_BYTES) and yield tuples (index of first frame, chunk) """
+        if chunk_size is None:
+            chunk_size = frames_per_chunk(self)
+        for start in range(0, self._shape[0], chunk_size):
+            yield start, self.get_frames(start, min(start + chunk_size, self._shape[0]))
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        t_key, xy_key = key[0], key[1:]
+        if isinstance(t_key, (int, np.integer)):
+            t = int(t_key) + (self._shape[0] if t_key < 0 else 0)
+            if t < 0 or t >= self._shape[0]:
+                raise IndexError(f"Frame {int(t_key)} is out of bounds for a stack with {self._shape[0]} frames")
+            return self.get_frames(t, t+1)[0][xy_key]
+        if isinstance(t_key, slice) and t_key.indices(self._shape[0])[2] == 1:
+            start, stop, _ = t_key.indices(self._shape[0])
+            stop = max(start, stop)
+            if len(xy_key) == 0:
+                return self.get_frames(start, stop)
+            chunk_size = frames_per_chunk(self)
+            _parts = [self.get_frames(i, min(i + chunk_size, stop))[(slice(None), *xy_key)] for i in range(start, stop, chunk_size)]
+            if len(_parts) == 0:
+                return np.empty(shape=(0, *self._shape[1:]), dtype=self._dtype)[(slice(None), *xy_key)]
+            return np.concatenate(_parts)
+        indices = np.arange(self._shape[0])[t_key]
+        r = np.empty(shape=(len(indices), *self._shape[1:]), dtype=self._dtype)[(slice(None), *xy_key)]
+        for i, t in enumerate(indices):
+            r[i] = self.get_frames(int(t), int(t)+1)[0][xy_key]
+        return r
+
+    def __neg__(self) -> "LazyImageStack":
+        return MappedImageStack(self, np.negative, dtype=self._dtype)
+
+    def __array__(self, dtype: Any = None, copy: bool|None = None) -> np.ndarray:
+        logger.debug(f"Loading the lazy image stack of shape {self._shape} into memory")
+        r = self.get_frames(0, self._shape[0])
+        return r.astype(dtype, copy=False) if dtype is not None else r
+
+    def close(self) -> None:
+        """ Release all resources (for example file handles) hold by this stack """
+        pass
+
+    def __del__(self):
+        self.close()
+
+def subset_indices(shape: tuple[int, ...], frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> tuple[range, tuple[slice, slice], tuple[int, ...]]:
+    """
+        Resolves a frame range and a spatial crop for an image stack of the given shape (t, y, x, ...)
+
+        :param slice|None frames: The frames to select (start, stop and step)
+        :param tuple[slice, slice]|None crop: The spatial region (y, x) to select
+        :returns: The selected frame indices, the crop as tuple of slices and the resulting shape
+        :raises ValueError: The selection is empty
+    """
+    frame_indices = range(shape[0])[frames if frames is not None else slice(None)]
+    crop = crop if crop is not None else (slice(None), slice(None))
+    _y, _x = range(shape[1])[crop[0]], range(shape[2])[crop[1]]
+    r_shape = (len(frame_indices), len(_y), len(_x), *shape[3:])
+    if 0 in r_shape[:3]:
+        raise ValueError(f"Selecting the frames {frames} and the crop {crop} on an image of shape {shape} results in an empty image")
+    return frame_indices, crop, r_shape
+
+class TiffPageStack(LazyImageStack):
+    """ 
+        A lazy image stack reading (and decoding) the frames of a TIFF file page by page on demand. Used for compressed or non contiguous files, which 
+        can't be memory mapped. Multiple pages are decoded in parallel in the shared thread pool, while only the file access itself is serialized.
+        Optionally, only a subset of the frames (pages) and a spatial crop is provided, so that all other pages are never read
+    """
+
+    def __init__(self, path: Path|str, frames: slice|None = None, crop: tuple[slice, slice]|None = None):
+        """
+            :param slice|None frames: Only provide the given frames (start, stop and step)
+            :param tuple[slice, slice]|None crop: Only provide the given spatial region (y, x)
+            :raises ValueError: The file can't be read page by page or the selection is empty
+        """
+        self._tif: tifffile.TiffFile|None = tifffile.TiffFile(path)
+        series = self._tif.series[0]
+        self._pages = series.pages
+        keyframe_shape = tuple(series.keyframe.shape)
+        if len(self._pages) <= 1 or tuple(series.shape) != (len(self._pages), *keyframe_shape) or len(keyframe_shape) < 2:
+            self.close()
+            raise ValueError(f"The TIFF series of shape {series.shape} can not be read page by page")
+        try:
+            self._frame_indices, self._crop, shape = subset_indices(tuple(series.shape), frames, crop)
+        except ValueError:
+            self.close()
+            raise
+        self._cropped = (crop is not None)
+        self._lock = threading.RLock()
+        super().__init__(shape=shape, dtype=series.dtype)
+
+    @property
+    def tif(self) -> tifffile.TiffFile|None:
+        """ The underlying TiffFile object """
+        return self._tif
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        r = np.empty(shape=(max(stop - start, 0), *self._shape[1:]), dtype=self._dtype)
+        self.read_frames_into(start, stop, r)
+        return r
+
+    def read_frames_into(self, start: int, stop: int, out: np.ndarray, callback: Callable[[int], Any]|None = None) -> None:
+        if self._tif is None:
+            raise ValueError("The TIFF file has already been closed")
+        def _read(i: int) -> int:
+            with self._lock:
+                page = self._pages[self._frame_indices[i]] # Accessing a page may parse its header from the file
+            assert page is not None
+            if self._cropped:
+                out[i - start] = page.asarray(lock=self._lock, maxworkers=1)[self._crop]
+            else:
+                page.asarray(out=out[i - start], lock=self._lock, maxworkers=1)
+            return i
+        for i in parallel_map(_read, range(start, stop)):
+            if callback is not None:
+                callback(i)
+
+    def close(self) -> None:
+        if getattr(self, "_tif", None) is not None:
+            self._tif.close() # type: ignore
+            self._tif = None
+
+class ND2FrameStack(LazyImageStack):
+    """ 
+        A lazy image stack reading the frames of a ND2 file (NIS Elements) on demand. Only supports files with a single sequence dimension (t, y, x).
+        Multiple frames are read in parallel in the shared thread pool, with each worker thread using its own file handle. Optionally, only a subset of
+        the frames and a spatial crop is provided, so that all other frames are never read
+    """
+
+    def __init__(self, path: Path|str, frames: slice|None = None, crop: tuple[slice, slice]|None = None):
+        """
+            :param slice|None frames: Only provide the given frames (start, stop and step)
+            :param tuple[slice, slice]|None crop: Only provide the given spatial region (y, x)
+            :raises ValueError: The file has not the shape (t, y, x) or the selection is empty
+        """
+        self._path = path
+        self._nd2file: nd2.ND2File|None = nd2.ND2File(path)
+        if self._nd2file.ndim != 3:
+            shape = self._nd2file.shape
+            self.close()
+            raise ValueError(f"The ND2 file of shape {shape} can not be read frame by frame")
+        try:
+            self._frame_indices, self._crop, shape = subset_indices(tuple(self._nd2file.shape), frames, crop)
+        except ValueError:
+            self.close()
+            raise
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._handles: list[nd2.ND2File] = []
+        super().__init__(shape=shape, dtype=self._nd2file.dtype)
+
+    def _handle(self) -> nd2.ND2File:
+        """ Returns the file handle of the current thread """
+        if self._nd2file is None:
+            raise ValueError("The ND2 file has already been closed")
+        if threading.current_thread() is threading.main_thread():
+            return self._nd2file
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = nd2.ND2File(self._path)
+            self._local.handle = handle
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        r = np.empty(shape=(max(stop - start, 0), *self._shape[1:]), dtype=self._dtype)
+        self.read_frames_into(start, stop, r)
+        return r
+
+    def read_frames_into(self, start: int, stop: int, out: np.ndarray, callback: Callable[[int], Any]|None = None) -> None:
+        if self._nd2file is None:
+            raise ValueError("The ND2 file has already been closed")
+        def _read(i: int) -> int:
+            out[i - start] = self._handle().read_frame(self._frame_indices[i])[self._crop]
+            return i
+        for i in parallel_map(_read, range(start, stop)):
+            if callback is not None:
+                callback(i)
+
+    def close(self) -> None:
+        if getattr(self, "_nd2file", None) is not None:
+            self._nd2file.close() # type: ignore
+            self._nd2file = None
+        with getattr(self, "_lock", threading.RLock()):
+            for handle in getattr(self, "_handles", []):
+                handle.close()
+            self._handles = []
+
+class DeltaImageStack(LazyImageStack):
+    """
+        A lazy image stack providing the delta video (img[t+1] - img[t]) of a source stack (an array, a memory mapped array or another LazyImageStack) on 
+        demand. Small requests (e.g. single frames for the frame slider) are served from a small cache of recently read source frames, larger requests 
+        are calculated chunk wise
+    """
+
+    FRAME_CACHE_SIZE: int = 16
+    """ Number of source frames kept in the frame cache """
+
+    def __init__(self, source: np.ndarray|LazyImageStack, dtype: Any, sign: int = 1):
+        """
+            :param np.ndarray|LazyImageStack source: The source image stack (t, y, x)
+            :param dtype: The (signed) dtype of the delta video
+            :param int sign: Set to -1 to return the negated delta video (img[t] - img[t+1])
+        """
+        self._source = source
+        self._sign = sign
+        self._frame_cache: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        super().__init__(shape=(max(source.shape[0] - 1, 0), *source.shape[1:]), dtype=dtype)
+
+    @property
+    def source(self) -> np.ndarray|LazyImageStack:
+        return self._source
+
+    def _source_frame(self, t: int) -> np.ndarray:
+        with self._lock:
+            if t in self._frame_cache:
+                self._frame_cache.move_to_end(t)
+                return self._frame_cache[t]
+        frame = np.asarray(self._source[t]).astype(self._dtype, copy=False)
+        with self._lock:
+            self._frame_cache[t] = frame
+            while len(self._frame_cache) > self.FRAME_CACHE_SIZE:
+                self._frame_cache.popitem(last=False)
+        return frame
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        stop = max(start, stop)
+        r = np.empty(shape=(stop - start, *self._shape[1:]), dtype=self._dtype)
+        if stop - start <= self.FRAME_CACHE_SIZE // 2:
+            for i, t in enumerate(range(start, stop)):
+                np.subtract(self._source_frame(t+1), self._source_frame(t), out=r[i])
+        else:
+            chunk_size = frames_per_chunk(self)
+            for i in range(start, stop, chunk_size):
+                chunk = np.asarray(self._source[i:(min(i + chunk_size, stop) + 1)]).astype(self._dtype, copy=False)
+                np.subtract(chunk[1:], chunk[:-1], out=r[(i - start):(i - start + chunk.shape[0] - 1)])
+        if self._sign < 0:
+            np.negative(r, out=r)
+        return r
+
+    def __neg__(self) -> "DeltaImageStack":
+        return DeltaImageStack(self._source, self._dtype, sign=-self._sign)
+
+    def close(self) -> None:
+        if getattr(self, "_frame_cache", None) is not None:
+            self._frame_cache.clear()
+
+class MappedImageStack(LazyImageStack):
+    """
+        A lazy image stack applying a function block wise to the frames of a source stack (an array, a memory mapped array or another LazyImageStack) 
+        on demand. This allows to chain filters on image stacks not fitting into memory. Filters along the temporal axis need the neighbouring frames 
+        of a block, which are read additionally (halo) and cut off afterwards. As the halo at the stack borders is clipped, the result is identical to 
+        applying the function to the whole stack as long as the function only depends on frames within the halo
+    """
+
+    def __init__(self, source: np.ndarray|LazyImageStack, fn: Callable[..., np.ndarray], dtype: Any, halo: int = 0, offset: int = 0, pass_start: bool = False):
+        """
+            :param np.ndarray|LazyImageStack source: The source image stack (t, y, x)
+            :param Callable[..., np.ndarray] fn: Function applied to a block of source frames and returning an array of the same shape
+            :param dtype: The dtype of the result
+            :param int halo: Number of frames read additionally before and after a block
+            :param int offset: Number of source frames skipped at the start (e.g. 1 to map the frames img[1:])
+            :param bool pass_start: If set, fn is called with the index of the first source frame of the block as second argument. Use this for 
+                functions depending on the absolute frame position
+        """
+        self._source = source
+        self._fn = fn
+        self._halo = max(0, int(halo))
+        self._offset = max(0, int(offset))
+        self._pass_start = pass_start
+        super().__init__(shape=(max(source.shape[0] - self._offset, 0), *source.shape[1:]), dtype=dtype)
+
+    @property
+    def source(self) -> np.ndarray|LazyImageStack:
+        return self._source
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        stop = max(start, stop)
+        if start == stop:
+            return np.empty(shape=(0, *self._shape[1:]), dtype=self._dtype)
+        t0, t1 = start + self._offset, stop + self._offset
+        h0, h1 = max(self._offset, t0 - self._halo), min(self._source.shape[0], t1 + self._halo)
+        if self._pass_start:
+            block = np.asarray(self._fn(np.asarray(self._source[h0:h1]), h0))
+        else:
+            block = np.asarray(self._fn(np.asarray(self._source[h0:h1])))
+        return block[(t0 - h0):(t1 - h0)].astype(self._dtype, copy=False)
+
+    def iter_chunks(self, chunk_size: int|None = None) -> Iterator[tuple[int, np.ndarray]]:
+        """ Iterate over the stack like LazyImageStack.iter_chunks(), but calculate the chunks in parallel in the shared thread pool """
+        if chunk_size is None:
+            chunk_size = frames_per_chunk(self)
+        _starts = range(0, self._shape[0], chunk_size)
+        yield from zip(_starts, parallel_map(lambda i: self.get_frames(i, min(i + chunk_size, self._shape[0])), _starts))
+
+class SubImageStack(LazyImageStack):
+    """ A lazy image stack providing a frame range and a spatial crop of a source stack (e.g. a LazyImageStack) by reading only the selected frames """
+
+    def __init__(self, source: np.ndarray|LazyImageStack, frames: slice|None = None, crop: tuple[slice, slice]|None = None):
+        """
+            :param slice|None frames: The frames to provide (start, stop and step)
+            :param tuple[slice, slice]|None crop: The spatial region (y, x) to provide
+            :raises ValueError: The selection is empty
+        """
+        self._source = source
+        self._frame_indices, self._crop, shape = subset_indices(source.shape, frames, crop)
+        super().__init__(shape=shape, dtype=source.dtype)
+
+    @property
+    def source(self) -> np.ndarray|LazyImageStack:
+        return self._source
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        indices = self._frame_indices[start:max(start, stop)]
+        if len(indices) == 0:
+            return np.empty(shape=(0, *self._shape[1:]), dtype=self._dtype)
+        block = self._source[indices.start:(indices[-1] + 1)] if indices.step == 1 else self._source[np.asarray(indices)]
+        return np.asarray(block)[(slice(None), *self._crop)]
+
+class FrameIndexStack(LazyImageStack):
+    """ 
+        A virtual image stack providing the frames of a source stack given by an index array (e.g. all frames without the signal) without copying them. 
+        Runs of consecutive indices are read as slices from the source
+    """
+
+    def __init__(self, source: np.ndarray|LazyImageStack, indices: np.ndarray|list[int]):
+        """
+            :param np.ndarray|list[int] indices: The frame indices of the source stack
+            :raises IndexError: An index is out of bounds
+        """
+        self._source = source
+        self._indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if len(self._indices) > 0 and (self._indices.min() < 0 or self._indices.max() >= source.shape[0]):
+            raise IndexError(f"The frame indices are out of bounds for a stack with {source.shape[0]} frames")
+        super().__init__(shape=(len(self._indices), *source.shape[1:]), dtype=source.dtype)
+
+    @property
+    def source(self) -> np.ndarray|LazyImageStack:
+        return self._source
+    
+    @property
+    def indices(self) -> np.ndarray:
+        return self._indices
+
+    def get_frames(self, start: int, stop: int) -> np.ndarray:
+        indices = self._indices[start:max(start, stop)]
+        if len(indices) == 0:
+            return np.empty(shape=(0, *self._shape[1:]), dtype=self._dtype)
+        runs = np.split(indices, np.flatnonzero(np.diff(indices) != 1) + 1)
+        return np.concatenate([np.asarray(self._source[r[0]:(r[-1] + 1)]) for r in runs])
+
+def open_tiff_lazy(path: Path|str, frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> np.ndarray|LazyImageStack:
+    """
+        Opens a TIFF file without reading the image data into memory. Contiguous files are memory mapped (read only), compressed files are
+        returned as a TiffPageStack decoding the pages on demand
+
+        :param slice|None frames: Only provide the given frames (start, stop and step)
+        :param tuple[slice, slice]|None crop: Only provide the given spatial region (y, x)
+        :raises ValueError: The file can neither be memory mapped nor read page by page or the selection is empty
+    """
+    t0 = time.perf_counter()
+    with tifffile.TiffFile(path) as tif:
+        series = tif.series[0]
+        contiguous = series.dataoffset is not None and not (len(series.shape) == 4 and series.shape[3] > 1)
+    if contiguous:
+        img = tifffile.memmap(path, series=0, mode="r")
+        if len(img.shape) == 4 and img.shape[3] == 1:
+            img = img[..., 0]
+        if len(img.shape) != 3:
+            raise ValueError(f"The memory mapped TIFF file has an unsupported shape {img.shape}")
+        if frames is not None or crop is not None:
+            _, crop, _ = subset_indices(img.shape, frames, crop)
+            img = img[(frames if frames is not None else slice(None)), crop[0], crop[1]] # Slicing keeps the array memory mapped
+        logger.debug(f"Memory mapped '{Path(path).name}' in {(time.perf_counter() - t0):1.3f} s")
+        return img
+    img = TiffPageStack(path, frames=frames, crop=crop)
+    if len(img.shape) != 3:
+        img.close()
+        raise ValueError(f"The TIFF file has an unsupported shape {img.shape} for reading it page by page")
+    logger.debug(f"Opened '{Path(path).name}' for reading page by page in {(time.perf_counter() - t0):1.3f} s")
+    return img
+
+def open_nd2_lazy(path: Path|str, frames: slice|None = None, crop: tuple[slice, slice]|None = None) -> LazyImageStack:
+    """
+        Opens a ND2 file without reading the image data into memory
+
+        :param slice|None frames: Only provide the given frames (start, stop and step)
+        :param tuple[slice, slice]|None crop: Only provide the given spatial region (y, x)
+        :raises ValueError: The file has not the shape (t, y, x) or the selection is empty
+    """
+    return ND2FrameStack(path, frames=frames, crop=crop)
+
+def materialize(img: LazyImageStack, chunk_size: int|None = None) -> np.ndarray:
+    """ Calculates a lazy stack chunk wise (for a MappedImageStack in parallel) into a single preallocated array """
+    r = np.empty(shape=img.shape, dtype=img.dtype)
+    for start, chunk in img.iter_chunks(chunk_size):
+        r[start:(start + chunk.shape[0])] = chunk
+    return r
+
+def is_lazy(img: Any) -> bool:
+    """ Returns True if the given image is not (fully) held in memory, i.e. it is a LazyImageStack or a memory mapped array """
+    return isinstance(img, (LazyImageStack, np.memmap))
+
+def frames_per_chunk(img: np.ndarray|LazyImageStack, chunk_bytes: int = CHUNK_BYTES) -> int:
+    """ Returns the number of frames, which fit into the given chunk size (at least 1) """
+    frame_bytes = int(np.prod(img.shape[1:]))*img.dtype.itemsize
+    return max(1, chunk_bytes // max(frame_bytes, 1))
+
+def iter_chunks(img: np.ndarray|LazyImageStack, chunk_size: int|None = None) -> Iterator[tuple[int, np.ndarray]]:
+    """ Iterate over an in memory array, a memory mapped array or a LazyImageStack in chunks along the first axis. Yields tuples (index of first frame, chunk) """
+    if isinstance(img, LazyImageStack):
+        yield from img.iter_chunks(chunk_size)
+        return
+    if chunk_size is None:
+        chunk_size = frames_per_chunk(img)
+    for start in range(0, img.shape[0], chunk_size):
+        yield start, img[start:(start + chunk_size)]
@@ -0,0 +1,68 @@
+""" Provides a shared thread pool to parallelize numpy heavy work. As numpy releases the GIL for most operations, threads scale on multiple cores """
+from ..core.settings import UserSettings
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, TypeVar, Any
+import os
+import threading
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_executor: ThreadPoolExecutor|None = None
+_executor_workers: int = 0
+_executor_lock = threading.Lock()
+_worker_local = threading.local()
+
+def worker_count() -> int:
+    """ Returns the number of worker threads as configured in the settings (PERFORMANCE.worker_count). A value of zero or less means to use all cores """
+    n = UserSettings.PERFORMANCE.worker_count.get()
+    if n <= 0:
+        n = os.cpu_count() or 1
+    return max(1, n)
+
+def _init_worker() -> None:
+    _worker_local.is_worker = True
+
+def in_worker() -> bool:
+    """ Returns True if called from inside a worker thread of the shared thread pool """
+    return getattr(_worker_local, "is_worker", False)
+
+def get_executor() -> ThreadPoolExecutor:
+    """ Returns the shared thread pool. The pool is recreated if the configured worker count has changed """
+    global _executor, _executor_workers
+    with _executor_lock:
+        n = worker_count()
+        if _executor is None or _executor_workers != n:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix="Neurotorch worker", initializer=_init_worker)
+            _executor_workers = n
+        return _executor
+
+def parallel_map(fn: Callable[[T], R], iterable: Iterable[T], max_pending: int|None = None) -> Iterator[R]:
+    """
+        Apply fn to every item of iterable in the shared thread pool and yield the results in order. At most max_pending items (defaults to twice the
+        worker count) are submitted at the same time, so that lazily generated items (e.g. chunks of an image) are not all loaded into memory at once.
+        When called from inside a worker thread or with only one worker, the items are processed sequentially to prevent deadlocks
+    """
+    if in_worker() or worker_count() == 1:
+        for item in iterable:
+            yield fn(item)
+        return
+    executor = get_executor()
+    if max_pending is None:
+        max_pending = 2*worker_count()
+    pending: deque[Future[Any]] = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        for f in pending:
+            f.cancel()
@@ -17,6 +17,13 @@ class ISignalDetectionAlgorithm:
             This method should return an 1D array (t,) interpretated as signal of the image
         """
         raise NotImplementedError()
+    
+    def get_identifier(self) -> str:
+        """
+            Returns a string identifying the algorithm and its parameters, which is used as key for caching the signal (e.g. in the disk cache). 
+            Algorithms with parameters must include them, for example 'MyAlgorithm(threshold=2)'
+        """
+        return type(self).__qualname__
 
 class SignalObject:
     """ 
@@ -57,7 +64,14 @@ class SignalObject:
     def signal(self) -> np.ndarray|None:
         """ Returns the signal from the image by calculating it using SignalObject.ALGORITHM on the first call"""
         if self._signal is None:
-            self._signal = self.__class__.ALGORITHM.get_signal(self.imgObj)
+            _persistent = self.imgObj.is_persistent(self.imgObj.img_diff_functions)
+            _key = f"signal:{self.__class__.ALGORITHM.get_identifier()}:{self.imgObj.get_functions_identifier(self.imgObj.img_diff_functions)}"
+            if _persistent and (_cached := self.imgObj.load_cached_arrays(_key)) is not None:
+                self._signal = _cached["signal"]
+            else:
+                self._signal = self.__class__.ALGORITHM.get_signal(self.imgObj)
+                if _persistent and self._signal is not None:
+                    self.imgObj.store_cached_arrays(_key, {"signal": self._signal})
         return self._signal
 
     @property
@@ -157,8 +171,9 @@ class SignalObject:
                         continue
                     _slices.append(slice(pStart, pStop))
             if len(_slices) > 0:
-                _sliceObj = np.s_[_slices]
-                _views[ImageView.DEFAULT] = AxisImage(img=np.concatenate([_img[_slice] for _slice in _sliceObj]), axis=ImageView.DEFAULT.value, name=f"{self.imgObj.name}-{img_type}-{slice_type}")
+                # The frames are provided by a virtual stack, so that the views are reduced chunk wise without copying the image
+                _indices = np.concatenate([np.arange(_slice.start, _slice.stop) for _slice in _slices])
+                _views[ImageView.DEFAULT] = AxisImage(img=FrameIndexStack(_img, _indices), axis=ImageView.DEFAULT.value, name=f"{self.imgObj.name}-{img_type}-{slice_type}")
             else:
                 _views[ImageView.DEFAULT] = AxisImage(img=None, axis=ImageView.DEFAULT.value, name=f"{self.imgObj.name}-{img_type}-{slice_type}")
 
@@ -172,7 +187,7 @@ class SignalObject:
             raise NoImageError()
         match path.suffix.lower():
             case ".tif"|".tiff":
-                tifffile.imwrite(path, data=self.img_props_only_signal.img, metadata=self.imgObj.metadata, compression="zlib")
+                ImageObject._write_tiff(path, self.img_props_only_signal.img, self.imgObj.metadata) # Streams the frames into the file
             case _:
                 raise UnsupportedExtensionError(f"The extension '{path.suffix}' is not supported for exporting")
         logger.info(f"Exported the video as '{path.name}'")
@@ -183,7 +198,7 @@ class SignalObject:
             raise NoImageError()
         match path.suffix.lower():
             case ".tif"|".tiff":
-                tifffile.imwrite(path, data=self.img_props_without_signal.img, metadata=self.imgObj.metadata, compression="zlib")
+                ImageObject._write_tiff(path, self.img_props_without_signal.img, self.imgObj.metadata) # Streams the frames into the file
             case _:
                 raise UnsupportedExtensionError(f"The extension '{path.suffix}' is not supported for exporting")
         logger.info(f"Exported the video as '{path.name}'")